@@ -0,0 +1,62 @@
+"""Microbenchmark: cost of one styled line through fancy_print().
+
+Compares the shared, cached printer behind ``fun.fancy_print`` with building a fresh
+``FancyPrinter`` for every call (what ``fun.fancy_print`` used to do), and with a style
+compiled once by ``compile_style()``. Output goes to ``os.devnull`` so only the printer
+is measured.
+
+Usage (with fun installed, e.g. ``pip install -e .``):
+    ``$ python benchmarks/bench_fancy_print.py [--number 20000]``
+
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+from fun.printing.formatted_console_print import FancyPrinter, fancy_print, compile_style
+
+
+KWARGS = dict(fg='light_cerulean', bg='dark_grey', bold=True, underscore=True)
+STYLE = compile_style(**KWARGS)
+
+
+def fresh_printer_per_call():
+    FancyPrinter().fancy_print('COMMUNICATOR MESSAGE: Sending email to: ', **KWARGS)
+
+
+def shared_printer():
+    fancy_print('COMMUNICATOR MESSAGE: Sending email to: ', **KWARGS)
+
+
+def compiled_style():
+    STYLE.write('COMMUNICATOR MESSAGE: Sending email to: ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='Calls per measurement.')
+    parser.add_argument('--repeat', type=int, default=5, help='Measurements per case; the best is kept.')
+    args = parser.parse_args()
+
+    results = dict()
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            for f in (fresh_printer_per_call, shared_printer, compiled_style):
+                best = min(timeit.repeat(f, number=args.number, repeat=args.repeat))
+                results[f.__name__] = best / args.number
+        finally:
+            sys.stdout = stdout
+
+    for name, t in results.items():
+        print(f'{name:<28} {t * 1e9:10.0f} ns/call')
+    base = results['fresh_printer_per_call']
+    print(f'\nShared, cached printer is {base / results["shared_printer"]:.1f}x faster.')
+    print(f'Compiled style is {base / results["compiled_style"]:.1f}x faster.')
+
+
+if __name__ == '__main__':
+    main()
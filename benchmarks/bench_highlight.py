@@ -0,0 +1,105 @@
+"""Throughput benchmark: highlighting a log stream.
+
+Compares ``Highlighter.highlight_stream()`` (one combined pattern, precompiled escapes, one write
+per chunk) with a naive loop that runs each rule over every line and calls ``fancy_print()`` for
+every piece of text. Output goes to ``os.devnull`` so only the highlighting is measured.
+
+Two logs are measured: a busy one where every line has matches, and a quiet one where one line
+in a hundred does. Both stay far below hundreds of MB/s (about 6 and 11 MB/s on the machine
+this was written on): matching runs in Python's ``re``, which scans a combined pattern of
+several rules at tens of MB/s at best, and every match costs a few Python operations on top.
+
+Usage (with fun installed, e.g. ``pip install -e .``):
+    ``$ python benchmarks/bench_highlight.py [--lines 200000]``
+
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import argparse
+
+from fun.printing.formatted_console_print import fancy_print
+from fun.printing.highlight import Highlighter
+
+
+RULES = {
+    r'\bERROR\b|\bFATAL\b': 'bold error',
+    r'\bWARN(ING)?\b': 'warning',
+    r'\b\d+\.\d+\.\d+\.\d+\b': 'cerulean underscore',
+    r'\b\d+ ms\b': 'light_green',
+}
+
+LINES = (
+    '2020-11-02 06:00:01 INFO  request from 10.0.0.12 served in 12 ms\n',
+    '2020-11-02 06:00:02 WARN  slow response from 10.0.0.40 took 950 ms\n',
+    '2020-11-02 06:00:03 ERROR upstream 10.0.0.7 refused connection\n',
+    '2020-11-02 06:00:04 DEBUG cache hit ratio 0.93\n',
+)
+
+
+QUIET_LINE = '2020-11-02 06:00:04 DEBUG cache hit ratio 0.93, queue depth nominal\n'
+
+
+def make_log(n):
+    return ''.join(LINES[i % len(LINES)] for i in range(n)).encode('utf-8')
+
+
+def make_quiet_log(n):
+    """One line in a hundred has matches."""
+    return ''.join(LINES[2] if i % 100 == 0 else QUIET_LINE for i in range(n)).encode('utf-8')
+
+
+def naive(data):
+    """Every rule over every line, one fancy_print() per piece of text."""
+    rules = [(re.compile(p), s) for p, s in RULES.items()]
+    styles = {'bold error': dict(fg='error', bold=True), 'warning': dict(fg='warning'),
+              'cerulean underscore': dict(fg='cerulean', underscore=True), 'light_green': dict(fg='light_green')}
+    for line in data.decode('utf-8').splitlines():
+        pos = 0
+        spans = sorted((m.start(), m.end(), s) for r, s in rules for m in r.finditer(line))
+        for start, end, style in spans:
+            if start < pos:
+                continue
+            fancy_print(line[pos:start], end='')
+            fancy_print(line[start:end], end='', **styles[style])
+            pos = end
+        fancy_print(line[pos:])
+
+
+def streaming(data, devnull):
+    Highlighter(RULES).highlight_stream(io.BytesIO(data), devnull)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=200000, help='Log lines to highlight.')
+    args = parser.parse_args()
+
+    for label, data in (('Busy log', make_log(args.lines)), ('Quiet log', make_quiet_log(args.lines))):
+        mb = len(data) / 1e6
+
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as text_null, open(os.devnull, 'wb') as byte_null:
+            sys.stdout = text_null
+            try:
+                t0 = time.perf_counter()
+                naive(data)
+                t_naive = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                streaming(data, byte_null)
+                t_stream = time.perf_counter() - t0
+            finally:
+                sys.stdout = stdout
+
+        print(f'{label}, {mb:.1f} MB:')
+        print(f'    {"fancy_print per match":<24} {mb / t_naive:8.1f} MB/s')
+        print(f'    {"highlight_stream":<24} {mb / t_stream:8.1f} MB/s')
+        print(f'    Streaming highlighter is {t_naive / t_stream:.1f}x faster.')
+
+
+if __name__ == '__main__':
+    main()
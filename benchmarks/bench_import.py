@@ -0,0 +1,65 @@
+"""Benchmark: cost of ``import fun`` for a process that only prints, vs one that also sends.
+
+Each case runs in a fresh interpreter, so nothing is cached between runs.
+
+Usage:
+    ``$ python benchmarks/bench_import.py [--runs 20]``
+
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+
+# The code that is timed inside each fresh interpreter
+CASES = {
+    'import fun': 'import fun',
+    'import fun; fun.fancy_print': 'import fun; fun.fancy_print',
+    'import fun; fun.et': 'import fun; fun.et',
+}
+
+HEAVY_MODULES = ['smtplib', 'email.message', 'email.utils', 'mimetypes', 'platform', 'json']
+
+PROBE = '''
+import sys, time
+t = time.perf_counter()
+{code}
+dt = time.perf_counter() - t
+loaded = [m for m in {heavy!r} if m in sys.modules]
+import json
+print(json.dumps([dt, loaded]))
+'''
+
+
+def run_case(code, runs):
+    """Returns (median seconds, heavy modules loaded) over fresh interpreters."""
+    times, loaded = list(), list()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(code=code, heavy=HEAVY_MODULES)],
+                             check=True, capture_output=True, text=True).stdout
+        dt, loaded = json.loads(out)
+        times.append(dt)
+    return statistics.median(times), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='Fresh interpreters per case.')
+    args = parser.parse_args()
+
+    results = dict()
+    for name, code in CASES.items():
+        results[name] = run_case(code, args.runs)
+        t, loaded = results[name]
+        print(f'{name:<32} {t * 1e3:8.2f} ms   heavy modules loaded: {", ".join(loaded) or "none"}')
+
+    eager = results['import fun; fun.et'][0]
+    lazy = results['import fun; fun.fancy_print'][0]
+    print(f'\nPrinting-only import is {eager / lazy:.1f}x faster than loading the communicator.')
+
+
+if __name__ == '__main__':
+    main()
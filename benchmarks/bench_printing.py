@@ -0,0 +1,270 @@
+"""Benchmark suite for the printing subsystem, with stored baselines.
+
+Measures:
+    * ns per call of the module-level ``fancy_print()``, ``FancyPrinter.fancy_print()``
+      and a compiled ``Style.write()``
+    * lines per second to ``os.devnull`` and through an OS pipe with a reader on the other end
+    * ns per call with each formatting option on its own, and with ``header=True``
+    * bytes allocated per call (peak, via tracemalloc) and memory blocks left behind per call
+
+Results are compared with ``benchmarks/baselines.json``. Every metric there has a direction
+(lower or higher is better), a threshold (the largest slowdown ratio accepted before the check
+fails) and a slack (an absolute allowance, for metrics that are normally near zero). Timings
+depend on the machine, so refresh the baselines with ``--update`` on the machine that runs
+``--check``.
+
+Colors are forced to 24-bit (``FUN_COLOR=truecolor``), the most expensive path, unless the
+environment already sets ``FUN_COLOR``.
+
+Usage (with fun installed, e.g. ``pip install -e .``):
+    ``$ python benchmarks/bench_printing.py``             Print results and the change from baseline
+    ``$ python benchmarks/bench_printing.py --check``     Exit with status 1 on a regression
+    ``$ python benchmarks/bench_printing.py --update``    Store the results as the new baseline
+
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import threading
+import tracemalloc
+
+os.environ.setdefault('FUN_COLOR', 'truecolor')
+
+from fun.printing.formatted_console_print import FancyPrinter, fancy_print, compile_style  # noqa: E402
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+TEXT = 'COMMUNICATOR MESSAGE: Sending email to: joe@somewhere.com'
+KWARGS = dict(fg='light_cerulean', bg='dark_grey', bold=True, underscore=True)
+
+# Each formatting option on its own
+OPTIONS = {
+    'plain': dict(),
+    'fg': dict(fg='light_cerulean'),
+    'bg': dict(bg='dark_grey'),
+    'bold': dict(bold=True),
+    'underscore': dict(underscore=True),
+    'italic': dict(italic=True),
+    'strikethrough': dict(strikethrough=True),
+    'framed': dict(framed=True),
+    'highlight': dict(highlight=True),
+    'header': dict(header=True),
+    'end': dict(end=''),
+}
+
+# Default regression thresholds: largest accepted ratio between result and baseline
+TIME_THRESHOLD = 1.5
+ALLOC_THRESHOLD = 1.1
+
+# Absolute allowance for memory blocks kept per call, which is normally zero
+BLOCKS_SLACK = 0.1
+
+
+class _Redirect(object):
+    """Points sys.stdout somewhere else for the duration of a block."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __enter__(self):
+        self.saved = sys.stdout
+        sys.stdout = self.stream
+        return self.stream
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sys.stdout = self.saved
+
+
+def best_ns(f, number, repeat):
+    """Returns the best time per call of f, in ns, over `repeat` runs of `number` calls."""
+    return min(timeit.repeat(f, number=number, repeat=repeat)) / number * 1e9
+
+
+def per_call(number, repeat):
+    """ns per call of the three ways to print one styled line."""
+    printer = FancyPrinter(color_depth=os.environ['FUN_COLOR'])
+    style = compile_style(**KWARGS)
+    results = dict()
+    with open(os.devnull, 'w') as devnull, _Redirect(devnull):
+        results['call.module_fancy_print_ns'] = best_ns(lambda: fancy_print(TEXT, **KWARGS), number, repeat)
+        results['call.printer_fancy_print_ns'] = best_ns(lambda: printer.fancy_print(TEXT, **KWARGS), number, repeat)
+        results['call.style_write_ns'] = best_ns(lambda: style.write(TEXT), number, repeat)
+    return results
+
+
+def per_option(number, repeat):
+    """ns per call of the module-level fancy_print() with one option at a time."""
+    results = dict()
+    with open(os.devnull, 'w') as devnull, _Redirect(devnull):
+        for name, kw in OPTIONS.items():
+            results[f'option.{name}_ns'] = best_ns(lambda: fancy_print(TEXT, **kw), number, repeat)
+    return results
+
+
+def _lines_per_s(stream, lines):
+    with _Redirect(stream):
+        t = time.perf_counter()
+        for _ in range(lines):
+            fancy_print(TEXT, **KWARGS)
+        stream.flush()
+        return lines / (time.perf_counter() - t)
+
+
+def throughput(lines, repeat):
+    """Lines per second to os.devnull and through a pipe that is drained by another thread."""
+    results = dict()
+    with open(os.devnull, 'w') as devnull:
+        results['lines_per_s.devnull'] = max(_lines_per_s(devnull, lines) for _ in range(repeat))
+
+    r, w = os.pipe()
+
+    def drain():
+        while os.read(r, 1 << 16):
+            pass
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    with os.fdopen(w, 'w') as pipe:
+        results['lines_per_s.pipe'] = max(_lines_per_s(pipe, lines) for _ in range(repeat))
+    reader.join()
+    os.close(r)
+    return results
+
+
+def allocations(calls):
+    """Peak bytes allocated during one call, and memory blocks left behind per call."""
+    results = dict()
+    with open(os.devnull, 'w') as devnull, _Redirect(devnull):
+        fancy_print(TEXT, **KWARGS)  # Warm the caches
+
+        tracemalloc.start()
+        peaks = list()
+        for _ in range(calls):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.clear_traces()  # Also resets the peak
+            fancy_print(TEXT, **KWARGS)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        results['alloc.peak_bytes_per_call'] = float(sorted(peaks)[len(peaks) // 2])
+
+        before = sys.getallocatedblocks()
+        for _ in range(calls):
+            fancy_print(TEXT, **KWARGS)
+        results['alloc.blocks_kept_per_call'] = max(sys.getallocatedblocks() - before, 0) / calls
+    return results
+
+
+def describe(name):
+    """Returns (higher is better, threshold, slack) for a metric."""
+    if name.startswith('lines_per_s.'):
+        return True, TIME_THRESHOLD, 0.0
+    if name == 'alloc.blocks_kept_per_call':
+        return False, ALLOC_THRESHOLD, BLOCKS_SLACK
+    if name.startswith('alloc.'):
+        return False, ALLOC_THRESHOLD, 0.0
+    return False, TIME_THRESHOLD, 0.0
+
+
+def run_all(args):
+    results = dict()
+    results.update(per_call(args.number, args.repeat))
+    results.update(per_option(args.number, args.repeat))
+    results.update(throughput(args.lines, args.repeat))
+    results.update(allocations(1000))
+    return results
+
+
+def load_baselines():
+    if not os.path.exists(BASELINE_FILE):
+        return None
+    with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(results):
+    metrics = dict()
+    for name, value in sorted(results.items()):
+        higher, threshold, slack = describe(name)
+        metrics[name] = dict(value=round(value, 3), higher_is_better=higher, threshold=threshold, slack=slack)
+    doc = dict(
+        machine=platform.machine(),
+        python=platform.python_version(),
+        color_depth=os.environ['FUN_COLOR'],
+        updated=time.strftime('%Y-%m-%d'),
+        metrics=metrics,
+    )
+    with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, indent=2)
+        f.write('\n')
+
+
+def compare(results, baselines):
+    """Prints each result next to its baseline. Returns the names of regressed metrics."""
+    metrics = baselines['metrics'] if baselines is not None else dict()
+    regressions = list()
+    for name, value in results.items():
+        line = f'{name:<36} {value:14.1f}'
+        base = metrics.get(name)
+        if base is not None:
+            b = base['value']
+            slack = base.get('slack', 0.0)
+            if base['higher_is_better']:
+                bad = value < b / base['threshold'] - slack
+                ratio = b / value if value > 0 else float('inf')
+            else:
+                bad = value > b * base['threshold'] + slack
+                ratio = value / b if b > 0 else 1.0 + value
+            line += f'   baseline {b:14.1f}   cost x{ratio:5.2f}' + ('   REGRESSION' if bad else '')
+            if bad:
+                regressions.append(name)
+        print(line)
+
+    plain = results.get('option.plain_ns')
+    if plain:
+        print('\nCost of each option over plain text:')
+        for name in OPTIONS:
+            if name != 'plain':
+                print(f'    {name:<16} {results[f"option.{name}_ns"] - plain:+8.0f} ns')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='Calls per timing run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing runs per case; the best is kept.')
+    parser.add_argument('--lines', type=int, default=100000, help='Lines per throughput run.')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--check', action='store_true', help='Exit with status 1 if any metric regressed.')
+    group.add_argument('--update', action='store_true', help='Store the results as the new baselines.')
+    args = parser.parse_args()
+
+    results = run_all(args)
+    baselines = load_baselines()
+    if baselines is not None and baselines.get('color_depth') != os.environ['FUN_COLOR']:
+        print(f'Baselines were measured at color depth {baselines.get("color_depth")!r}; not comparing.')
+        baselines = None
+    regressions = compare(results, baselines)
+
+    if args.update:
+        save_baselines(results)
+        print(f'\nBaselines written to {BASELINE_FILE}')
+        return 0
+    if args.check:
+        if baselines is None:
+            print('\nNo baselines to check against. Run with --update first.')
+            return 1
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            return 1
+        print('\nNo regressions.')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -4,6 +4,27 @@ __author__ = "Christopher Couch"
 __license__ = "Strictly proprietary for Liveline Technologies, Inc."
 __version__ = "2020-11"
 
+import importlib
 
-from fun.printing.formatted_console_print import fancy_print
-from fun.communications import communicator as et
+# Public names and where they live. They are imported on first access, so ``import fun``
+# stays cheap: the printer doesn't pay for smtplib, email, mimetypes, etc.
+# Maps name -> (module, attribute); an attribute of None means the module itself.
+_lazy_attributes = {
+    'fancy_print': ('fun.printing.formatted_console_print', 'fancy_print'),
+    'et': ('fun.communications.communicator', None),
+}
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module_name, attr = _lazy_attributes[name]
+    value = importlib.import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
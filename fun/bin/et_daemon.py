@@ -0,0 +1,17 @@
+"""Runs E.T.'s local daemon, keeping a warm Communicator for scripts on this machine.
+
+WARNING:
+    - You must first configure your SMTP connection. See the method ``_setup_smtp_server()``
+      in the Communicator object defined in ``fun/communications/communicator.py``.
+
+Usage:
+    ``$ python et_daemon.py [--socket PATH] [--no-socket] [--http PORT]``
+
+Then, from any script:
+    ``>>> from fun.communications import daemon; daemon.phone_home('Hello', 'physics')``
+
+"""
+
+from fun.communications.daemon import main
+
+raise SystemExit(main())
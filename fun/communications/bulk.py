@@ -0,0 +1,170 @@
+"""Bulk sending: stream message records from JSONL through one shared Communicator.
+
+Each input line is a JSON object that mirrors the arguments of ``phone_home()``, e.g.
+``{"body": "Shift starts at 6", "who": "physics", "subject": "Reminder", "disable_sms": true}``.
+
+Records are read lazily and only a bounded number are in flight at any time, so memory use does
+not grow with the size of the input. One JSON delivery report is written per input line, e.g.
+``{"line": 1, "ok": true, "deliveries": [...], "error": null}``.
+
+Usage:    ``$ cat batch.jsonl | fun-send --workers 8 --report report.jsonl --progress``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fun.communications.communicator import Communicator
+
+
+DEFAULT_WORKERS = 4
+
+
+class BulkSender(object):
+    """Sends a stream of message records concurrently and reports on each one.
+
+    Methods implemented:
+        - `run( )` : Sends every record from an iterable of JSONL lines.
+
+    """
+
+    def __init__(self, communicator=None, workers=DEFAULT_WORKERS, retries=0, quiet=True):
+        """Initial setup.
+
+        Arguments:
+            communicator (Communicator): Optional. Shared communicator. A new one is built if omitted.
+            workers (int): Optional. Number of messages sent at the same time. Default is DEFAULT_WORKERS.
+            retries (int): Optional. Default for records that do not set 'retries'. Default is 0.
+            quiet (bool): Optional. Default for records that do not set 'quiet'. Default is True.
+        """
+        if not isinstance(workers, int) or workers < 1:
+            msg = f'\'workers\' must be a positive integer but you gave {workers!r}'
+            raise ValueError(msg)
+
+        self.communicator = communicator if communicator is not None else Communicator()
+        self.communicator.use_session_pool(max_idle=workers)
+        self.workers = workers
+        self.retries = retries
+        self.quiet = quiet
+
+        self.sent = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        return
+
+    def __repr__(self):
+        return f'Bulk sender with {self.workers} workers'
+
+    def run(self, lines, report=None, on_done=None):
+        """Sends every record.
+
+        Arguments:
+            lines (iterable): JSONL lines (str or bytes). Blank lines are skipped.
+            report (file): Optional. Text stream receiving one JSON report line per record.
+            on_done (callable): Optional. Called with each report dict once its record is done.
+
+        Returns:
+            A tuple (sent, failed) counting the records of this run. Also kept in `sent` and `failed`.
+        """
+        with self._lock:
+            self.sent = 0
+            self.failed = 0
+
+        # Bounds the number of records in flight, so a huge input never piles up in memory
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def finish(result):
+            try:
+                with self._lock:
+                    if result['ok']:
+                        self.sent += 1
+                    else:
+                        self.failed += 1
+                    if report is not None:
+                        report.write(json.dumps(result) + '\n')
+                if on_done is not None:
+                    on_done(result)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for n, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                slots.acquire()
+                pool.submit(self._send_one, n, line).add_done_callback(lambda f: finish(f.result()))
+
+        if report is not None:
+            report.flush()
+        return self.sent, self.failed
+
+    def _send_one(self, n, line):
+        """Sends one record and returns its report dict. Never raises."""
+        result = dict(line=n, ok=False, deliveries=list(), error=None)
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict) or 'body' not in record or 'who' not in record:
+                raise ValueError('record must be an object with \'body\' and \'who\'')
+            body = record.pop('body')
+            who = record.pop('who')
+            subject = record.pop('subject', None)
+            record.setdefault('retries', self.retries)
+            record.setdefault('quiet', self.quiet)
+            deliveries = self.communicator.send_msg(body, who, subject, **record)
+            result['deliveries'] = deliveries
+            result['ok'] = len(deliveries) > 0 and all(d['ok'] for d in deliveries)
+            if len(deliveries) == 0:
+                result['error'] = 'No recipients or attachment missing'
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+        return result
+
+
+def main(argv=None):
+    """Console entry point for ``fun-send``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='fun-send', description='Send messages from JSONL records.')
+    parser.add_argument('input', nargs='?', default='-', help='JSONL file to read. Default is stdin.')
+    parser.add_argument('--report', default='-', help='Where to write the JSONL report. Default is stdout.')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent sends.')
+    parser.add_argument('--retries', type=int, default=0, help='Extra attempts per failed delivery.')
+    parser.add_argument('--verbose', action='store_true', help='Print each delivery to the console.')
+    parser.add_argument('--progress', action='store_true', help='Show a progress line on stderr.')
+    args = parser.parse_args(argv)
+
+    src = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    dst = sys.stdout if args.report == '-' else open(args.report, 'w', encoding='utf-8')
+    try:
+        with Communicator() as c:
+            sender = BulkSender(c, workers=args.workers, retries=args.retries, quiet=not args.verbose)
+            if args.progress:
+                from fun.printing.progress import Progress
+
+                with Progress(label='fun-send', stream=sys.stderr) as p:
+                    def on_done(result):
+                        if not result['ok']:
+                            p.count('failed')
+                        p.advance()
+
+                    sent, failed = sender.run(src, report=dst, on_done=on_done)
+            else:
+                sent, failed = sender.run(src, report=dst)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+    print(f'fun-send: {sent} sent, {failed} failed', file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
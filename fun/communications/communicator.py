@@ -1,4 +1,4 @@
-"""ET Phone Home! Send messages via email and SMS."""
+"""ET Phone Home! Send messages via email, SMS and webhooks."""
 
 __author__ = "Christopher Couch"
 __license__ = "MIT"
@@ -8,14 +8,23 @@ import platform
 import smtplib
 import json
 import re
-import mimetypes
-from string import Template
+import socket
 from pathlib import Path
+from contextlib import ExitStack
+from datetime import datetime
+from email import quoprimime
 from email.message import EmailMessage
 from email.utils import make_msgid
 
 # Be sure to install fun to your current VENV!
+from fun.profiling import profiled
+from fun.printing.data import Data
 from fun.printing.formatted_console_print import fancy_print
+from fun.printing.markup import markup_print
+from fun.communications.templates import TemplateLibrary, DEFAULT_TEMPLATE, TEMPLATE_SUFFIX
+from fun.communications.sessions import SessionPool
+from fun.communications import attachments
+from fun.communications.webhook import WebhookEndpoint, get_client, is_url
 
 
 # ==================================================================
@@ -44,8 +53,20 @@ INTERNAL_USER_PWD = None
 COMMUNICATOR_MSG_COLOR = 'light_cerulean'
 COMMUNICATOR_WARN_COLOR = 'yellow'
 
+# Console lines printed for each recipient; see fun.printing.markup
+SENDING_EMAIL_MARKUP = f'[{COMMUNICATOR_MSG_COLOR}]COMMUNICATOR MESSAGE: Sending email to: [/][hlink]{{}}[/]'
+SENDING_SMS_MARKUP = f'[{COMMUNICATOR_MSG_COLOR}]COMMUNICATOR MESSAGE: Sending SMS message to: [/][cerulean]{{}}[/]'
+SENDING_WEBHOOK_MARKUP = f'[{COMMUNICATOR_MSG_COLOR}]COMMUNICATOR MESSAGE: Posting to webhook: [/][cerulean]{{}}[/]'
+
 EMAIL_SIGNATURE_LOGO_FILE = 'liveline_logo.png'  # Use None to disable
 
+# Compression used with compress_attachment=True; see fun.communications.attachments
+ATTACHMENT_COMPRESSION = 'zip'  # 'zip', 'gzip', or None to attach files as-is
+ATTACHMENT_COMPRESSION_THRESHOLD = attachments.DEFAULT_THRESHOLD  # Bytes
+
+# Errors that mean the SMTP connection is gone; the next attempt reconnects
+SMTP_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
 root = Path(__file__).parent.absolute()
 
 
@@ -54,21 +75,28 @@ root = Path(__file__).parent.absolute()
 # ==================================================================
 
 class Communicator(object):
-    """Handler for external communications via email and SMS.
+    """Handler for external communications via email, SMS and webhooks.
 
     Methods implemented:
         - `send_msg( )` : Sends messages, email and/or SMS.
+        - `use_session_pool( )` : Keeps SMTP sessions open between calls to `send_msg( )`.
+        - `close( )` : Quits any pooled SMTP sessions.
 
     """
 
+    @profiled('communicator.init')
     def __init__(self):
         """Initial setup."""
 
         self.attachments_enabled = None
         self.contacts = None
+        self.full_names = None
+        self.webhooks = None
+        self.templates = TemplateLibrary(root)
         self.template = None
         self.machine = None
         self.sms_email_stubs = None
+        self.session_pool = None
 
         # Can hard-code this later.
         # All outgoing emails will be cc'd to address in this list.
@@ -82,24 +110,39 @@ class Communicator(object):
         return
 
     def __repr__(self):
-        return 'Communications for email and SMS'
+        return 'Communications for email, SMS and webhooks'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     # =====================================================
     # Public methods
     # =====================================================
 
+    @profiled('send_msg')
     def send_msg(self, body, who, subject=None, **kwargs):
-        """Sends email and SMS messages.
+        """Sends email, SMS and webhook messages.
 
         **NOTES FOR TARGETING RECIPIENTS WITH 'who':**
-            - `'who'` can be a user name, group name, email, or mobile number.
+            - `'who'` can be a user name, group name, webhook name, email, mobile number, or URL.
             - It can be an individual item or a list of items.
-            - User and group names are defined in ``contact_list.json``.
+            - User, group and webhook names are defined in ``contact_list.json``. Groups can list
+              webhook names among their members.
+            - Webhooks get the message as JSON; see ``fun.communications.webhook``.
             - When targeting users or groups, you can toggle the mode of communication using
               `use_email` and `use_sms`. By default, only SMS is used.
             - Mobile numbers can be any format, but they must contain 10 digits in addition to any
               leading 0s or 1s. Integers and strings are OK.
 
+        **NOTES FOR TEMPLATES:**
+            - Templates are the ``<name>_template.txt`` files next to this module.
+            - ``${BODY}`` and ``${MACHINE}`` are rendered once per message.
+            - ``${FULL_NAME}`` is rendered per recipient from ``contact_list.json``. Recipients that
+              are not in the directory get their email address or mobile number instead.
+
         Arguments:
             body (str): Contents of message.
             who (obj): User name, group name, email, or mobile number. Single items, or a list of many.
@@ -107,8 +150,12 @@ class Communicator(object):
             subject (str): Optional. Subject of message. Default is None.
 
         Keyword Arguments:
-            attachment (Path): Path-like object that points to a file.
+            attachment (Path): Path-like object that points to a file, or a ``fun.printing.Data``
+                table, which is attached as CSV.
                 Default is None.
+            compress_attachment (bool): If True, large text, CSV and JSON attachments are sent
+                zipped, per ATTACHMENT_COMPRESSION and ATTACHMENT_COMPRESSION_THRESHOLD.
+                Default is False (files are attached as they are).
             disable_email (bool): If True, emails will not be sent to any recipients.
                 This can be useful if you want to send only SMS messages to users or groups in the
                 contact_list.json.
@@ -117,96 +164,82 @@ class Communicator(object):
                 This can be useful if you want to send only email messages to users or groups in the
                 contact_list.json.
                 Default is False.
+            disable_webhooks (bool): If True, nothing will be posted to webhooks. Default is False.
+            template (str): Name of the message template. Default is 'email'.
+            retries (int): Number of extra attempts for each failed delivery. Default is 0.
+            quiet (bool): If True, nothing is printed to the console. Default is False.
 
         Returns:
-            No returns.
+            A list of delivery records, one per email address, mobile number or webhook, e.g.
+            ``{'channel': 'email', 'to': 'joe@somewhere.com', 'ok': True, 'error': None}``.
+            The list is empty if there was nothing to send.
         """
 
         # ============================================================
         # Parse and bail out if needed
         # ============================================================
 
-        self._parse_who(who)
-
-        if not self._ensure_recipients_exist():
-            return
-
         # Kwargs
         attachment = kwargs.get('attachment', None)
+        compress_attachment = kwargs.get('compress_attachment', False)
         disable_email = kwargs.get('disable_email', False)
         disable_sms = kwargs.get('disable_sms', False)
+        disable_webhooks = kwargs.get('disable_webhooks', False)
+        template = kwargs.get('template', DEFAULT_TEMPLATE)
+        retries = kwargs.get('retries', 0)
+        quiet = kwargs.get('quiet', False)
 
-        if not self._ensure_attachment_exists(attachment):
-            return
-
-        for b, n in zip([disable_email, disable_sms], ['disable_email', 'disable_sms']):
+        for b, n in zip([compress_attachment, disable_email, disable_sms, disable_webhooks, quiet],
+                        ['compress_attachment', 'disable_email', 'disable_sms', 'disable_webhooks', 'quiet']):
             if not isinstance(b, bool):
                 msg = f'\'{n}\' must be boolean but you gave type {type(b)}'
                 raise TypeError(msg)
 
+        if not isinstance(retries, int) or retries < 0:
+            msg = f'\'retries\' must be a non-negative integer but you gave {retries!r}'
+            raise TypeError(msg)
+
+        # Local lists, so one Communicator can be shared by several threads
+        email_list, mobile_list = self._parse_who(who)
+        webhook_list = self._parse_webhooks(who)
+
+        if not self._ensure_recipients_exist(email_list, mobile_list, webhook_list, quiet=quiet):
+            return list()
+
+        if not self._ensure_attachment_exists(attachment, quiet=quiet):
+            return list()
+
         # ============================================================
         # Main
         # ============================================================
 
-        with self._setup_smtp_server() as sess:
+        deliveries = list()
 
-            # Create msg object
-            msg = EmailMessage()
+        # Render everything that is the same for all recipients only once
+        bound = self.templates.get(template).bind(BODY=body, MACHINE=self.machine)
+        logo = self._get_logo()
+        attached = self._read_attachment(attachment, ATTACHMENT_COMPRESSION if compress_attachment else None)
 
-            # Personalize the template
-            body_from_template = self.template.substitute(BODY=body)
+        if attached is not None and attached[1]['compressed'] and not quiet:
+            info = attached[1]
+            stdout_msg = (f'COMMUNICATOR MESSAGE: Attaching {info["filename"]}, '
+                          f'compressed from {attachments.format_size(info["original_bytes"])} '
+                          f'(saves {attachments.format_size(info["saved_bytes"])} per email)')
+            fancy_print(stdout_msg, fg=COMMUNICATOR_MSG_COLOR)
 
-            # Set msg parameters;
-            # Note we will assign msg['To'] below when iterating over email addresses
-            msg['From'] = self.sender_address
-            msg['Subject'] = subject.upper() if isinstance(subject, str) else None
+        # Webhook-only messages never open an SMTP session
+        needs_smtp = (len(email_list) > 0 and not disable_email) or (len(mobile_list) > 0 and not disable_sms)
 
-            # Copy outgoing emails to cc list
-            if isinstance(self.cc_email_list, list):
-                if len(self.cc_email_list) > 0:
-                    msg['CC'] = ','.join(self.cc_email_list)
+        with ExitStack() as sessions:
+            sess = sessions.enter_context(self._smtp_session()) if needs_smtp else None
 
-            # Base text message
-            msg.set_content(body_from_template)
+            # Opens a replacement if the server drops the session; closed with the first one
+            def reconnect():
+                return sessions.enter_context(self._smtp_session())
 
-            # HTML version
-            body_html = re.sub(r'[\n]', '<br>', body_from_template)  # Replace /n with <br>
-            logo_cid = make_msgid()
-            msg.add_alternative("""\
-            <html>
-              <head></head>
-              <body>
-                <p>""" + body_html + '</p>' + """
-                <a href="https://www.liveline.tech">
-                <img src="cid:{logo_cid}" />
-                </a>
-              </body>
-            </html>
-            """.format(logo_cid=logo_cid[1:-1]), subtype='html')
-
-            # Add logo to the HTML version
-            if EMAIL_SIGNATURE_LOGO_FILE is not None:
-                t = root / EMAIL_SIGNATURE_LOGO_FILE
-                if t.exists():
-                    with open(t, 'rb') as img:
-                        r = img.read()
-                        # noinspection PyUnresolvedReferences
-                        msg.get_payload()[1].add_related(r, 'image', 'png', cid=logo_cid)
-
-            # Optionally attach a file
-            # First use mimetypes to try and guess content type based on file extension:
-            if attachment is not None:
-                attachment = Path(attachment)
-                ctype, encoding = mimetypes.guess_type(str(attachment))
-                if ctype is None or encoding is not None:
-                    # No guess could be made, or the file is encoded (compressed), so
-                    # use a generic bag-of-bits type.
-                    ctype = 'application/octet-stream'
-                maintype, subtype = ctype.split('/', 1)
-                maintype += f'; name="{attachment.name}"'
-                with open(attachment, 'rb') as file:
-                    r = file.read()
-                    msg.add_attachment(r, maintype=maintype, subtype=subtype)
+            # Shared message. If the template is personalized, it is built for the first recipient and
+            # only its text and HTML bodies are replaced for the others; logo and attachment are kept.
+            msg = None if bound.personalized or not needs_smtp else self._build_msg(bound, subject, logo, attached)
 
             # ============================================================
             # Email
@@ -214,12 +247,16 @@ class Communicator(object):
 
             # For each email & phone in current lists, send messages
             if not disable_email:
-                for e in self.current_email_list:
+                for e in email_list:
 
                     # Console out
-                    stdout_msg = f'COMMUNICATOR MESSAGE: Sending email to: '
-                    fancy_print(stdout_msg, fg=COMMUNICATOR_MSG_COLOR, end='')
-                    fancy_print(e, fg='hlink')
+                    if not quiet:
+                        markup_print(SENDING_EMAIL_MARKUP, e)
+
+                    if bound.personalized and msg is None:
+                        msg = self._build_msg(bound, subject, logo, attached, who=e)
+                    elif bound.personalized:
+                        self._personalize_msg(msg, bound, e)
 
                     # Update msg 'To:' field
                     if msg['To'] is not None:
@@ -230,9 +267,10 @@ class Communicator(object):
                     # with open('outgoing.msg', 'wb') as f:
                     #     f.write(bytes(msg))
 
-                    try:
-                        sess.send_message(msg)
-                    except:
+                    error, sess = self._send_with_retries(sess, msg, retries, reconnect)
+                    deliveries.append(dict(channel='email', to=e, ok=error is None, error=error))
+
+                    if error is not None and not quiet:
                         stdout_msg = f'COMMUNICATOR WARNING: Failed sending email message'
                         fancy_print(stdout_msg, fg=COMMUNICATOR_WARN_COLOR)
 
@@ -241,14 +279,12 @@ class Communicator(object):
             # ============================================================
 
             if not disable_sms:
-                for m in self.current_mobile_list:
+                for m in mobile_list:
 
                     # Console out
-                    stdout_msg = f'COMMUNICATOR MESSAGE: Sending SMS message to: '
-                    fancy_print(stdout_msg, fg=COMMUNICATOR_MSG_COLOR, end='')
-                    fancy_print(m[0:3] + '.' + m[3:6] + '.' + m[6:10], fg='cerulean')
+                    if not quiet:
+                        markup_print(SENDING_SMS_MARKUP, m[0:3] + '.' + m[3:6] + '.' + m[6:10])
 
-                    any_ok = False
                     candidates = list()
 
                     # Try all the stubs!
@@ -257,6 +293,11 @@ class Communicator(object):
                     for stub in self.sms_email_stubs:
                         candidates.append(m + self.sms_email_stubs[stub])
 
+                    if bound.personalized and msg is None:
+                        msg = self._build_msg(bound, subject, logo, attached, who=m)
+                    elif bound.personalized:
+                        self._personalize_msg(msg, bound, m)
+
                     # Update msg 'To:' field
                     if msg['To'] is not None:
                         del msg['To']
@@ -266,27 +307,242 @@ class Communicator(object):
                     # with open('outgoing.msg', 'wb') as f:
                     #     f.write(bytes(msg))
 
-                    try:
-                        sess.send_message(msg)
-                        any_ok = True
-                    except:
-                        pass
+                    error, sess = self._send_with_retries(sess, msg, retries, reconnect)
+                    deliveries.append(dict(channel='sms', to=m, ok=error is None, error=error))
 
-                    if not any_ok:
+                    if error is not None and not quiet:
                         stdout_msg = f'COMMUNICATOR WARNING: Failed sending SMS message'
                         fancy_print(stdout_msg, fg=COMMUNICATOR_WARN_COLOR)
 
+        # ============================================================
+        # Webhooks
+        # ============================================================
+
+        if not disable_webhooks and len(webhook_list) > 0:
+            payload = dict(
+                subject=subject,
+                body=body if isinstance(body, str) else str(body),
+                machine=self.machine,
+                sent=datetime.now().isoformat(timespec='seconds'),
+            )
+
+            # Shared client: connections and batches are reused across messages and threads
+            client = get_client()
+            for h in webhook_list:
+
+                # Console out
+                if not quiet:
+                    markup_print(SENDING_WEBHOOK_MARKUP, h.name)
+
+                error = client.send(h, payload, retries)
+                deliveries.append(dict(channel='webhook', to=h.name, ok=error is None, error=error))
+
+                if error is not None and not quiet:
+                    stdout_msg = f'COMMUNICATOR WARNING: Failed posting to webhook'
+                    fancy_print(stdout_msg, fg=COMMUNICATOR_WARN_COLOR)
+
+        return deliveries
+
+    def use_session_pool(self, max_idle=1):
+        """Keeps SMTP sessions open between calls to `send_msg( )`.
+
+        Useful for long-running processes that send many messages.
+
+        Arguments:
+            max_idle (int): Optional. Maximum number of idle sessions kept open. Default is 1.
+
+        Returns:
+            The ``SessionPool``.
+        """
+        if self.session_pool is None:
+            self.session_pool = SessionPool(self._setup_smtp_server, max_idle=max_idle)
+        else:
+            self.session_pool.max_idle = max_idle
+        return self.session_pool
+
+    def close(self):
+        """Quits any pooled SMTP sessions."""
+        if self.session_pool is not None:
+            self.session_pool.close()
         return
 
     # =====================================================
     # Private methods
     # =====================================================
 
+    def _smtp_session(self):
+        """Returns a context manager yielding an SMTP session, pooled if enabled."""
+        if self.session_pool is not None:
+            return self.session_pool.acquire()
+        return self._setup_smtp_server()
+
+    @profiled('mime.build')
+    def _build_msg(self, bound, subject, logo, attached, who=None):
+        """Returns an email message object rendered from a bound template.
+
+        Arguments:
+            bound (BoundTemplate): Template with the per-message fields already rendered.
+            subject (str): Subject of message, or None.
+            logo (bytes): PNG image for the HTML signature, or None.
+            attached (tuple): (part, info) from ``_read_attachment()``, or None.
+            who (str): Optional. Email address or mobile number used to personalize the message.
+        """
+
+        # Per-recipient fields
+        fields = self._recipient_fields(bound, who)
+
+        # Create msg object
+        msg = EmailMessage()
+
+        # Set msg parameters;
+        # Note we will assign msg['To'] when iterating over email addresses
+        msg['From'] = self.sender_address
+        msg['Subject'] = subject.upper() if isinstance(subject, str) else None
+
+        # Copy outgoing emails to cc list
+        if isinstance(self.cc_email_list, list):
+            if len(self.cc_email_list) > 0:
+                msg['CC'] = ','.join(self.cc_email_list)
+
+        # Base text message
+        msg.set_content(bound.render(**fields))
+
+        # HTML version
+        body_html = bound.render_html(**fields)  # Replace /n with <br>
+        logo_cid = make_msgid()
+        msg.add_alternative(self._html(body_html, logo_cid[1:-1]), subtype='html')
+
+        # Add logo to the HTML version
+        if logo is not None:
+            # noinspection PyUnresolvedReferences
+            msg.get_payload()[1].add_related(logo, 'image', 'png', cid=logo_cid)
+
+        # Optionally attach a file; the prepared part is shared and cached, so it is encoded only once
+        if attached is not None:
+            if msg.get_content_type() != 'multipart/mixed':
+                msg.make_mixed()
+            msg.attach(attached[0])
+
+        return msg
+
+    @profiled('mime.personalize')
+    def _personalize_msg(self, msg, bound, who):
+        """Replaces the text and HTML bodies of a message from `_build_msg( )` for another recipient.
+
+        The logo, attachment, and headers are kept as they are, so they are not built or encoded again.
+
+        Arguments:
+            msg (EmailMessage): Message built for a personalized template.
+            bound (BoundTemplate): The template it was built from.
+            who (str): Email address or mobile number of the recipient.
+        """
+        fields = self._recipient_fields(bound, who)
+        html_part = msg.get_body(preferencelist=('html',))
+        related = next((p for p in msg.walk() if p.get_content_type() == 'multipart/related'), None)
+        logo_cid = related.get_payload()[1]['Content-ID'][1:-1] if related is not None else make_msgid()[1:-1]
+
+        _replace_text(msg.get_body(preferencelist=('plain',)), bound.render(**fields))
+        _replace_text(html_part, self._html(bound.render_html(**fields), logo_cid))
+        return
+
+    def _recipient_fields(self, bound, who):
+        """Returns the per-recipient template fields for `who`."""
+        fields = dict()
+        if bound.personalized:
+            full_name = self.full_names.get(who) if self.full_names is not None else None
+            fields['FULL_NAME'] = full_name if full_name is not None else who
+        return fields
+
+    @staticmethod
+    def _html(body_html, logo_cid):
+        """Returns the HTML version of a message, with the logo referenced by its content ID."""
+        return """\
+            <html>
+              <head></head>
+              <body>
+                <p>""" + body_html + '</p>' + """
+                <a href="https://www.liveline.tech">
+                <img src="cid:{logo_cid}" />
+                </a>
+              </body>
+            </html>
+            """.format(logo_cid=logo_cid)
+
+    @staticmethod
+    @profiled('smtp.send')
+    def _send_with_retries(sess, msg, retries, reconnect):
+        """Sends a message, trying up to `retries` extra times.
+
+        If the connection is lost, the session is closed and the next attempt runs on a new one.
+
+        Arguments:
+            sess (smtplib.SMTP): Open session, or None to open one first.
+            msg (EmailMessage): Message to send.
+            retries (int): Number of extra attempts.
+            reconnect (callable): Returns a new session.
+
+        Returns:
+            A tuple (error, session). `error` is None on success, otherwise a string describing
+            the last error. `session` is the one to use for the next message, or None if the
+            connection was lost.
+        """
+        error = None
+        for _ in range(retries + 1):
+            try:
+                if sess is None:
+                    sess = reconnect()
+                sess.send_message(msg)
+                return None, sess
+            except SMTP_CONNECTION_ERRORS as e:
+                error = f'{type(e).__name__}: {e}'
+                if sess is not None:
+                    sess.close()
+                    sess = None
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+        return error, sess
+
+    @staticmethod
+    def _get_logo():
+        """Returns the bytes of the email signature logo, or None."""
+        if EMAIL_SIGNATURE_LOGO_FILE is not None:
+            t = root / EMAIL_SIGNATURE_LOGO_FILE
+            if t.exists():
+                with open(t, 'rb') as img:
+                    return img.read()
+        return None
+
+    @staticmethod
+    @profiled('attachment.read')
+    def _read_attachment(attachment, compression=None):
+        """Returns a tuple (part, info) for a file to attach, or None.
+
+        See ``fun.communications.attachments.prepare()``.
+
+        Arguments:
+            attachment (obj): Path-like object, or a ``fun.printing.Data`` table (attached as CSV).
+            compression (str): Optional. 'zip', 'gzip', or None to attach as-is. Default is None.
+        """
+        if attachment is None:
+            return None
+
+        # Tables go out as CSV, straight from memory
+        if isinstance(attachment, Data):
+            content, filename = attachment.csv_bytes(), f'{attachment.name}.csv'
+        else:
+            attachment = Path(attachment)
+            with open(attachment, 'rb') as file:
+                content, filename = file.read(), attachment.name
+
+        return attachments.prepare(content, filename, compression=compression,
+                                   threshold=ATTACHMENT_COMPRESSION_THRESHOLD)
+
     def _get_machine_name(self):
         """Returns machine name and stores in state attribute."""
         self.machine = platform.uname().node
         return self.machine
 
+    @profiled('smtp.connect')
     def _setup_smtp_server(self):
         """Returns an smtp server object."""
 
@@ -343,10 +599,14 @@ class Communicator(object):
         msg = f'Could not establish SMTP connection'
         raise ConnectionError(msg)
 
+    @profiled('config.contacts')
     def _get_contacts(self, tgt):
         """Reads contact information from a JSON contact file.
 
-        Assigns to ``self.communications``: A nested dict with top-level keys 'groups', 'users'.
+        Assigns to ``self.communications``: A nested dict with top-level keys 'groups', 'users',
+        and optionally 'webhooks'.
+
+        Assigns to ``self.webhooks``: A dict of ``WebhookEndpoint`` by name.
 
         Arguments:
             tgt (str): A valid path and filename for the JSON contact list.
@@ -354,21 +614,44 @@ class Communicator(object):
         with open(tgt, mode='r', encoding='utf-8') as f:
             str_contents = f.read()
         self.contacts = json.loads(str_contents)
+        self._index_full_names()
+        self.webhooks = {name: WebhookEndpoint(name, **info)
+                         for name, info in self.contacts.get('webhooks', dict()).items()}
+        return
+
+    def _index_full_names(self):
+        """Maps each user's email and cleansed mobile number to their full name.
+
+        Assigns to ``self.full_names``: A dict used to personalize messages.
+        """
+        self.full_names = dict()
+        for u, info in self.contacts['users'].items():
+            name = info.get('full_name', u)
+            valid_emails, got_an_email = self._cleanse_emails(info.get('email'))
+            valid_mobiles, got_a_mobile = self._cleanse_phone_numbers(info.get('mobile'))
+            for elem in (valid_emails if got_an_email else []) + (valid_mobiles if got_a_mobile else []):
+                self.full_names.setdefault(elem, name)
         return
 
+    @profiled('config.template')
     def _get_template(self, tgt):
-        """Returns a Python string template for use in messages.
+        """Returns a compiled template for use in messages.
 
-        Assigns to ``self.template``: A Python string template.
+        Assigns to ``self.template``: A ``CompiledTemplate``, cached by ``self.templates``.
 
         Arguments:
             tgt (str): A valid path and filename for the template text file.
         """
-        with open(tgt, 'r', encoding='utf-8') as template_file:
-            template_file_content = template_file.read()
-        self.template = Template(template_file_content)
-        return
+        tgt = Path(tgt)
+        name = tgt.name[:-len(TEMPLATE_SUFFIX)] if tgt.name.endswith(TEMPLATE_SUFFIX) else tgt.stem
+        if tgt.parent == self.templates.directory:
+            self.template = self.templates.get(name)
+        else:
+            with open(tgt, 'r', encoding='utf-8') as template_file:
+                self.template = self.templates.add(name, template_file.read())
+        return self.template
 
+    @profiled('config.sms_stubs')
     def _get_sms_email_stubs(self, tgt):
         """Reads SMS email stub info from a JSON file.
 
@@ -382,6 +665,7 @@ class Communicator(object):
         self.sms_email_stubs = json.loads(str_contents)
         return
 
+    @profiled('parse_who')
     def _parse_who(self, who):
         """Parses who argument from send_msg().
 
@@ -391,7 +675,12 @@ class Communicator(object):
             - Arbitrary mobile number (any format); one string or 10-digit integer, or a list of strings/integers.
             - Arbitrary email address; one string or a list of strings
             - 'who' will be parsed in that order, and the first "hit" wins.
+            - Webhook names and URLs are skipped here; see ``_parse_webhooks()``.
+
+        Assigns to ``self.current_email_list`` and ``self.current_mobile_list``.
 
+        Returns:
+            A tuple (email_list, mobile_list) of sorted, de-duplicated recipients.
         """
 
         if not (isinstance(who, str) or isinstance(who, list) or isinstance(who, int)):
@@ -421,6 +710,10 @@ class Communicator(object):
 
         for w in who:
 
+            # Webhooks are parsed separately; see _parse_webhooks()
+            if w in self.webhooks or is_url(w):
+                continue
+
             w_email_list, w_mobile_list = list(), list()
             got_a_mobile, got_an_email, hit = False, False, False
 
@@ -453,6 +746,8 @@ class Communicator(object):
                 w_email_list = list()
                 w_mobile_list = list()
                 for u in user_list:
+                    if u not in users:
+                        continue  # A webhook; see _parse_webhooks()
                     e = users[u]['email'] if 'email' in users[u] else None
                     m = users[u]['mobile'] if 'mobile' in users[u] else None
                     w_email_list.append(e)
@@ -493,17 +788,51 @@ class Communicator(object):
                         final_email_list.append(elem)
 
         # Final assignments, no duplicates
-        self.current_mobile_list = list(set(final_mobile_list))
-        self.current_mobile_list.sort()
-        self.current_email_list = list(set(final_email_list))
-        self.current_email_list.sort()
+        mobile_list = sorted(set(final_mobile_list))
+        email_list = sorted(set(final_email_list))
+        self.current_mobile_list = mobile_list
+        self.current_email_list = email_list
 
-        return
+        return email_list, mobile_list
+
+    def _parse_webhooks(self, who):
+        """Parses webhook recipients from the who argument of send_msg().
 
-    def _ensure_recipients_exist(self):
-        if len(self.current_mobile_list) == 0 and len(self.current_email_list) == 0:
-            msg = f'COMMUNICATOR WARNING: No recipients identified. Check for valid phone/mobile.'
-            fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
+        **ALLOWABLE VALUES FOR 'who':**
+            - Webhook name in self.webhooks
+            - Group name in self.communications.group, for groups with webhook names as members
+            - Arbitrary http:// or https:// URL; one string or a list of strings
+
+        Returns:
+            A list of ``WebhookEndpoint``, de-duplicated and sorted by name.
+        """
+        if not isinstance(who, list):
+            who = [who]
+
+        users = self.contacts['users']
+        groups = self.contacts['groups']
+        found = dict()
+
+        for w in who:
+            if w in self.webhooks:
+                found[w] = self.webhooks[w]
+            elif is_url(w):
+                found[w] = WebhookEndpoint(w, w)
+            elif w in groups and w not in users:
+                for u in groups[w]:
+                    if u in self.webhooks:
+                        found[u] = self.webhooks[u]
+
+        return [found[k] for k in sorted(found)]
+
+    def _ensure_recipients_exist(self, email_list=None, mobile_list=None, webhook_list=None, quiet=False):
+        email_list = self.current_email_list if email_list is None else email_list
+        mobile_list = self.current_mobile_list if mobile_list is None else mobile_list
+        webhook_list = list() if webhook_list is None else webhook_list
+        if len(mobile_list) == 0 and len(email_list) == 0 and len(webhook_list) == 0:
+            if not quiet:
+                msg = f'COMMUNICATOR WARNING: No recipients identified. Check for valid phone/mobile.'
+                fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
             return False
         else:
             return True
@@ -584,42 +913,70 @@ class Communicator(object):
         return cleansed_list, hit
 
     @staticmethod
-    def _ensure_attachment_exists(target):
-        """Returns True if the targeted path exists (or is None) and false otherwise."""
-        if target is not None:
+    def _ensure_attachment_exists(target, quiet=False):
+        """Returns True if the targeted path exists (or is None or a Data table) and false otherwise."""
+        if target is not None and not isinstance(target, Data):
             target = Path(target)
             if not target.exists():
-                msg = f'COMMUNICATOR WARNING: The file specified for attachment to email does not exist'
-                fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
+                if not quiet:
+                    msg = f'COMMUNICATOR WARNING: The file specified for attachment to email does not exist'
+                    fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
                 return False
         return True
 
 
+def _replace_text(part, text):
+    """Replaces the text of a part made by ``set_content()``.
+
+    Re-encodes in the part's current transfer encoding, as ``set_content()`` would, so its
+    headers don't have to be parsed and set again. Falls back to ``set_content()`` if the new
+    text needs a different encoding.
+    """
+    cte = part['Content-Transfer-Encoding']
+    lines = text.encode('utf-8').splitlines()
+    body = b'\n'.join(lines) + b'\n'
+    if cte == 'quoted-printable':
+        part.set_payload(quoprimime.body_encode(body.decode('latin-1'), part.policy.max_line_length))
+    elif cte == '7bit' and body.isascii() and max((len(x) for x in lines), default=0) <= part.policy.max_line_length:
+        part.set_payload(body.decode('ascii'))
+    else:
+        part.set_content(text, subtype=part.get_content_subtype())
+    return
+
+
 # ==================================================================
 # Public function - utilizes the Communicator class
 # ==================================================================
 
-def phone_home(body, who, subject=None, **kwargs):
-    """Sends email and SMS messages.
+def phone_home(body, who, subject=None, send_at=None, every=None, **kwargs):
+    """Sends email, SMS and webhook messages.
 
     **NOTES FOR TARGETING RECIPIENTS WITH 'who':**
-        - `'who'` can be a user name, group name, email, or mobile number.
+        - `'who'` can be a user name, group name, webhook name, email, mobile number, or URL.
         - It can be an individual item or a list of items.
-        - User and group names are defined in ``contact_list.json``.
+        - User, group and webhook names are defined in ``contact_list.json``.
         - When targeting users or groups, you can toggle the mode of communication using
           `use_email` and `use_sms`. By default, only SMS is used.
         - Mobile numbers can be any format, but they must contain 10 digits in addition to any
           leading 0s or 1s. Integers and strings are OK.
+        - Use `template` to pick a message template by name. See ``Communicator.send_msg()``.
+        - Use `send_at` and `every` to send later or on a schedule. The message is queued in a shared,
+          in-process scheduler and the ``Job`` is returned instead of delivery records.
 
     Arguments:
         body (str): Contents of message.
         who (obj): User name, group name, email, or mobile number. Single items, or a list of many.
             See notes.
         subject (str): Optional. Subject of message. Default is None.
+        send_at (datetime): Optional. When to send. A naive datetime is local time. Default is None (now).
+        every (timedelta): Optional. Repeat the message at this interval. Default is None.
 
     Keyword Arguments:
-        attachment (Path): Path-like object that points to a file.
+        attachment (Path): Path-like object that points to a file, or a ``fun.printing.Data``
+            table, which is attached as CSV.
             Default is None.
+        compress_attachment (bool): If True, large text, CSV and JSON attachments are sent zipped.
+            Default is False.
         disable_email (bool): If True, emails will not be sent to any recipients.
             This can be useful if you want to send only SMS messages to users or groups in the
             contact_list.json.
@@ -628,12 +985,23 @@ def phone_home(body, who, subject=None, **kwargs):
             This can be useful if you want to send only email messages to users or groups in the
             contact_list.json.
             Default is False.
+        disable_webhooks (bool): If True, nothing will be posted to webhooks. Default is False.
+        template (str): Name of the message template. Default is 'email'.
+        retries (int): Number of extra attempts for each failed delivery. Default is 0.
+        quiet (bool): If True, nothing is printed to the console. Default is False.
+        until (datetime): Last time a recurring message may be sent. Default is None.
 
     Returns:
-        No returns.
+        A list of delivery records. See ``Communicator.send_msg()``.
+        If `send_at` or `every` is given, the scheduled ``Job`` instead.
     """
+    if send_at is not None or every is not None:
+        from fun.communications.scheduler import get_scheduler
+        when = send_at if send_at is not None else datetime.now()
+        return get_scheduler().schedule(when, body, who, subject, every=every, **kwargs)
+
     c = Communicator()
-    c.send_msg(body, who, subject, **kwargs)
+    return c.send_msg(body, who, subject, **kwargs)
 
 
 
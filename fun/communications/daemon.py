@@ -0,0 +1,359 @@
+"""E.T.'s switchboard: a local daemon that keeps a warm Communicator.
+
+The daemon builds one ``Communicator``, keeps its SMTP session open, and accepts messages
+from local scripts. Scripts then skip the config loads and SMTP handshake of ``phone_home()``.
+
+Messages are JSON objects that mirror the arguments of ``phone_home()``, e.g.
+``{"body": "Hello", "who": "physics", "subject": "Status", "disable_sms": true}``.
+They can be delivered two ways:
+    * Unix datagram socket (default): one ``sendto()`` per message.
+    * Localhost HTTP: ``POST /send`` with the JSON object as the request body.
+
+Only the keys in ALLOWED_KEYS are accepted. The socket is readable and writable by its owner
+only, so its messages may also carry an ``attachment``. Any local user can reach the HTTP port,
+so HTTP messages may not name attachments or webhook URLs, unless the daemon was started with a
+token and the request carries it as ``Authorization: Bearer <token>``.
+
+Start the daemon:    ``$ fun-et-daemon`` (or ``$ python fun/bin/et_daemon.py``)
+
+Then send:    ``>>> from fun.communications import daemon; daemon.phone_home('Hello', 'physics')``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import os
+import json
+import socket
+import tempfile
+
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'fun-et-daemon.sock')
+DEFAULT_HTTP_PORT = 8765
+DEFAULT_MAX_QUEUE = 10000
+
+# Unix datagrams larger than this are rejected by most kernels' default settings
+MAX_DATAGRAM_BYTES = 200000
+
+# Keys a message may carry; they mirror the arguments of phone_home()
+ALLOWED_KEYS = ('body', 'who', 'subject', 'template', 'retries', 'quiet', 'compress_attachment',
+                'disable_email', 'disable_sms', 'disable_webhooks')
+
+# Also allowed from trusted clients: the owner's socket, or HTTP with the daemon's token
+TRUSTED_KEYS = ('attachment',)
+
+# Environment variable holding the HTTP token, for the daemon and its clients
+TOKEN_ENV = 'FUN_DAEMON_TOKEN'
+
+# Client socket, created on first send and reused
+_client_sock = None
+
+
+# ==================================================================
+# Client
+# ==================================================================
+
+def phone_home(body, who, subject=None, socket_path=None, http_port=None, token=None, **kwargs):
+    """Hands a message to the local daemon. Takes the arguments of ``fun.et.phone_home()`` named in
+    ALLOWED_KEYS and TRUSTED_KEYS; scheduling (`send_at`, `every`, `until`) is not supported.
+
+    The message is queued by the daemon and sent in the background; no delivery status is returned.
+
+    Arguments:
+        body (str): Contents of message.
+        who (obj): User name, group name, email, or mobile number. Single items, or a list of many.
+        subject (str): Optional. Subject of message. Default is None.
+        socket_path (str): Optional. Path of the daemon's Unix socket. Default is DEFAULT_SOCKET_PATH.
+        http_port (int): Optional. If given, POST to the daemon's localhost HTTP endpoint instead.
+            Default is None.
+        token (str): Optional. The daemon's HTTP token, needed to send attachments or post to
+            webhook URLs over HTTP. Default is the environment variable FUN_DAEMON_TOKEN, if set.
+
+    Keyword Arguments:
+        See ``fun.et.phone_home()``. Only the keys in ALLOWED_KEYS and TRUSTED_KEYS.
+
+    Returns:
+        No returns.
+    """
+    global _client_sock
+
+    # The daemon drops messages with other keys without telling the client, so refuse them here
+    unknown = sorted(k for k in kwargs if k not in ALLOWED_KEYS and k not in TRUSTED_KEYS)
+    if len(unknown) > 0:
+        msg = (f'The daemon does not accept {unknown}. Valid keywords are: {list(ALLOWED_KEYS + TRUSTED_KEYS)}. '
+               f'Use fun.et.phone_home() to schedule messages.')
+        raise ValueError(msg)
+
+    payload = dict(kwargs, body=body, who=who, subject=subject)
+    data = json.dumps(payload, default=str).encode('utf-8')
+
+    if http_port is None and hasattr(socket, 'AF_UNIX'):
+        if _client_sock is None:
+            _client_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        _client_sock.sendto(data, socket_path if socket_path is not None else DEFAULT_SOCKET_PATH)
+        return
+
+    import http.client
+    headers = {'Content-Type': 'application/json'}
+    token = token if token is not None else os.environ.get(TOKEN_ENV)
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    conn = http.client.HTTPConnection('127.0.0.1', http_port if http_port is not None else DEFAULT_HTTP_PORT)
+    try:
+        conn.request('POST', '/send', body=data, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 202:
+            msg = f'Daemon rejected message with HTTP status {resp.status}'
+            raise RuntimeError(msg)
+    finally:
+        conn.close()
+    return
+
+
+# ==================================================================
+# Server
+# ==================================================================
+
+class Daemon(object):
+    """Receives messages from local clients and sends them through one warm Communicator.
+
+    Methods implemented:
+        - `serve_forever( )` : Runs until `shutdown( )` is called or the process is interrupted.
+        - `shutdown( )` : Stops listening, sends what is queued, and closes SMTP sessions.
+        - `submit( )` : Queues one JSON payload (bytes or dict).
+
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, http_port=None, max_queue=DEFAULT_MAX_QUEUE,
+                 http_token=None):
+        """Initial setup.
+
+        Arguments:
+            socket_path (str): Optional. Path for the Unix datagram socket. Use None to disable.
+                Default is DEFAULT_SOCKET_PATH.
+            http_port (int): Optional. Port for the localhost HTTP endpoint. Use None to disable.
+                Default is None.
+            max_queue (int): Optional. Messages waiting beyond this count are dropped with a warning.
+                Default is DEFAULT_MAX_QUEUE.
+            http_token (str): Optional. HTTP requests carrying ``Authorization: Bearer <token>`` are
+                trusted with attachments and webhook URLs. Default is None (no HTTP request is trusted).
+        """
+        import queue
+        import threading
+        from fun.communications.communicator import Communicator
+
+        if socket_path is not None and not hasattr(socket, 'AF_UNIX'):
+            socket_path = None
+        if socket_path is None and http_port is None:
+            msg = 'Daemon needs a Unix socket path or an HTTP port'
+            raise ValueError(msg)
+
+        self.socket_path = socket_path
+        self.http_port = http_port
+        self.http_token = http_token
+
+        # Loads contacts, templates and stubs once for the life of the daemon
+        self.communicator = Communicator()
+        self.communicator.use_session_pool(max_idle=1)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._threads = list()
+        self._sock = None
+        self._httpd = None
+        return
+
+    def __repr__(self):
+        return f'E.T. daemon on socket {self.socket_path} and HTTP port {self.http_port}'
+
+    def submit(self, payload, trusted=False):
+        """Queues one message.
+
+        Arguments:
+            payload (obj): JSON bytes/str or a dict with the arguments of ``phone_home()``.
+            trusted (bool): Optional. If True, the payload may also name an attachment and webhook
+                URLs. Default is False.
+
+        Returns:
+            True if queued, False if the payload was invalid or the queue is full.
+        """
+        import queue
+        from fun.communications.communicator import COMMUNICATOR_WARN_COLOR, fancy_print
+
+        try:
+            if not isinstance(payload, dict):
+                payload = json.loads(payload)
+            self._validate(payload, trusted)
+            self._queue.put_nowait(payload)
+        except (ValueError, queue.Full) as e:
+            msg = f'COMMUNICATOR WARNING: Daemon dropped a message: {str(e) or "queue is full"}'
+            fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
+            return False
+        return True
+
+    def serve_forever(self):
+        """Starts the listeners and the sender, then blocks until shutdown."""
+        import threading
+        from fun.communications.communicator import COMMUNICATOR_MSG_COLOR, fancy_print
+
+        workers = [self._send_loop]
+        if self.socket_path is not None:
+            self._open_socket()
+            workers.append(self._socket_loop)
+        if self.http_port is not None:
+            self._open_http()
+            workers.append(self._httpd.serve_forever)
+
+        for w in workers:
+            t = threading.Thread(target=w, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        fancy_print(f'COMMUNICATOR MESSAGE: {self!r} is listening', fg=COMMUNICATOR_MSG_COLOR)
+        try:
+            while not self._stop.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            pass
+        self.shutdown()
+        return
+
+    def shutdown(self):
+        """Stops listening, sends what is queued, and closes SMTP sessions."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+        self._queue.join()
+        self._stop.set()
+        self.communicator.close()
+        return
+
+    @staticmethod
+    def _validate(payload, trusted):
+        """Raises ValueError unless the payload is a message this client may send."""
+        from fun.communications.webhook import is_url
+
+        if not isinstance(payload, dict) or 'body' not in payload or 'who' not in payload:
+            raise ValueError('payload must be an object with \'body\' and \'who\'')
+        allowed = ALLOWED_KEYS + TRUSTED_KEYS if trusted else ALLOWED_KEYS
+        unknown = sorted(k for k in payload if k not in allowed)
+        if len(unknown) > 0:
+            raise ValueError(f'keys not allowed: {unknown}')
+        who = payload['who'] if isinstance(payload['who'], list) else [payload['who']]
+        if not all(isinstance(w, (str, int)) and not isinstance(w, bool) for w in who):
+            raise ValueError('\'who\' must be a string, an integer, or a list of them')
+        if not trusted and any(is_url(w) for w in who):
+            raise ValueError('webhook URLs are not allowed without the daemon\'s token')
+        return
+
+    def _open_socket(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+        # Owner-only from the moment it exists, not just after chmod
+        umask = os.umask(0o177)
+        try:
+            self._sock.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self._sock.settimeout(0.5)
+        return
+
+    def _socket_loop(self):
+        while not self._stop.is_set() and self._sock is not None:
+            try:
+                data = self._sock.recv(MAX_DATAGRAM_BYTES)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.submit(data, trusted=True)  # Only the owner can write to the socket
+
+    def _open_http(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                if self.path != '/send':
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self.send_error(400, 'Content-Length must be a non-negative integer')
+                    return
+                ok = daemon.submit(self.rfile.read(length), trusted=daemon._authorized(self.headers))
+                self.send_response(202 if ok else 400)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', self.http_port), Handler)
+        return
+
+    def _authorized(self, headers):
+        """Returns True if an HTTP request carries the daemon's token."""
+        import hmac
+
+        if not self.http_token:
+            return False
+        given = headers.get('Authorization', '')
+        return hmac.compare_digest(given.encode('utf-8'), f'Bearer {self.http_token}'.encode('utf-8'))
+
+    def _send_loop(self):
+        from fun.communications.communicator import COMMUNICATOR_WARN_COLOR, fancy_print
+
+        while True:
+            payload = self._queue.get()
+            try:
+                body = payload.pop('body')
+                who = payload.pop('who')
+                subject = payload.pop('subject', None)
+                self.communicator.send_msg(body, who, subject, **payload)
+            except Exception as e:
+                msg = f'COMMUNICATOR WARNING: Daemon failed sending a message: {e}'
+                fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
+            finally:
+                self._queue.task_done()
+
+
+def main(argv=None):
+    """Console entry point for ``fun-et-daemon``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='fun-et-daemon', description='Local daemon for E.T.\'s communicator.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='Unix socket path to listen on.')
+    parser.add_argument('--no-socket', action='store_true', help='Do not listen on a Unix socket.')
+    parser.add_argument('--http', type=int, default=None, metavar='PORT',
+                        help='Also listen for POST /send on this localhost port.')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE, help='Maximum messages waiting.')
+    args = parser.parse_args(argv)
+
+    # From the environment rather than the command line, so it doesn't show up in ps
+    d = Daemon(socket_path=None if args.no_socket else args.socket, http_port=args.http,
+               max_queue=args.max_queue, http_token=os.environ.get(TOKEN_ENV) or None)
+    d.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
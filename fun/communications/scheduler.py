@@ -0,0 +1,224 @@
+"""Delayed and recurring messages, sent from one in-process scheduler.
+
+Pending messages sit in a heap ordered by due time, so holding many of them is cheap.
+A single background thread sleeps until the earliest one is due, then sends every message that
+is due as one batch through a shared ``Communicator`` with a pooled SMTP session.
+
+Try:    ``>>> fun.et.phone_home('Shift change!', 'physics', send_at=datetime(2020, 11, 2, 6, 0),``
+        ``...                   every=timedelta(hours=8))``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+
+# Messages due within this many seconds of each other are sent in the same batch
+DEFAULT_BATCH_WINDOW = 1.0
+
+# Longest single sleep; keeps the scheduler honest if the wall clock jumps
+MAX_SLEEP = 60.0
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def _to_timestamp(when):
+    """Returns a POSIX timestamp from a datetime (naive means local time) or a number."""
+    if isinstance(when, datetime):
+        return when.timestamp()
+    if isinstance(when, (int, float)):
+        return float(when)
+    msg = f'\'send_at\' must be a datetime or POSIX timestamp but you gave type {type(when)}'
+    raise TypeError(msg)
+
+
+def _to_seconds(every):
+    """Returns a positive number of seconds from a timedelta or a number."""
+    seconds = every.total_seconds() if isinstance(every, timedelta) else every
+    if not isinstance(seconds, (int, float)) or seconds <= 0:
+        msg = f'\'every\' must be a positive timedelta or number of seconds but you gave {every!r}'
+        raise ValueError(msg)
+    return float(seconds)
+
+
+class Job(object):
+    """One scheduled message. Returned by `Scheduler.schedule( )`."""
+
+    __slots__ = ('due', 'every', 'until', 'args', 'kwargs', 'runs', 'last_result', 'cancelled')
+
+    def __init__(self, due, every, until, args, kwargs):
+        self.due = due
+        self.every = every
+        self.until = until
+        self.args = args
+        self.kwargs = kwargs
+        self.runs = 0
+        self.last_result = None
+        self.cancelled = False
+
+    def __repr__(self):
+        when = datetime.fromtimestamp(self.due).isoformat(sep=' ', timespec='seconds')
+        repeat = f', every {self.every:g} s' if self.every is not None else ''
+        return f'Message to {self.args[1]!r} due {when}{repeat}'
+
+    def __lt__(self, other):
+        return self.due < other.due
+
+    def cancel(self):
+        """Stops this job. Pending sends are skipped."""
+        self.cancelled = True
+
+
+class Scheduler(object):
+    """Holds pending messages and sends them when due.
+
+    Methods implemented:
+        - `schedule( )` : Adds a delayed or recurring message.
+        - `pending( )` : Returns the number of jobs waiting.
+        - `stop( )` : Stops the background thread.
+
+    """
+
+    def __init__(self, communicator=None, batch_window=DEFAULT_BATCH_WINDOW):
+        """Initial setup.
+
+        Arguments:
+            communicator (Communicator): Optional. Shared communicator. Built on first send if omitted.
+            batch_window (float): Optional. Messages due within this many seconds are sent together.
+                Default is DEFAULT_BATCH_WINDOW.
+        """
+        self.communicator = communicator
+        self.batch_window = batch_window
+        self._heap = list()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        return
+
+    def __repr__(self):
+        return f'Message scheduler with {self.pending()} pending'
+
+    def schedule(self, when, body, who, subject=None, every=None, until=None, **kwargs):
+        """Adds a delayed or recurring message.
+
+        Arguments:
+            when (datetime): When to send. A naive datetime is local time. A POSIX timestamp is also OK.
+            body (str): Contents of message.
+            who (obj): User name, group name, email, or mobile number. See ``fun.et.phone_home()``.
+            subject (str): Optional. Subject of message. Default is None.
+            every (timedelta): Optional. Repeat at this interval. Default is None.
+            until (datetime): Optional. Last time a recurring message may be sent. Default is None.
+
+        Keyword Arguments:
+            Passed to ``Communicator.send_msg()``.
+
+        Returns:
+            The ``Job``, which can be cancelled.
+        """
+        due = _to_timestamp(when)
+        every = _to_seconds(every) if every is not None else None
+        until = _to_timestamp(until) if until is not None else None
+
+        job = Job(due, every, until, (body, who, subject), kwargs)
+        with self._cond:
+            self._stopping = False
+            heapq.heappush(self._heap, job)
+            self._cond.notify()
+            if self._thread is None:
+                # Not a daemon thread: the process waits for pending messages before exiting
+                self._thread = threading.Thread(target=self._run, name='fun-scheduler')
+                self._thread.start()
+        return job
+
+    def pending(self):
+        """Returns the number of jobs waiting, not counting cancelled ones."""
+        with self._cond:
+            return sum(1 for j in self._heap if not j.cancelled)
+
+    def stop(self, wait=True):
+        """Stops the background thread. Jobs still pending are kept but not sent.
+
+        Arguments:
+            wait (bool): Optional. If True, waits for a batch being sent to finish. Default is True.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return
+
+    def _next_batch(self):
+        """Blocks until jobs are due; returns them, or None when there is nothing left to do."""
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0].cancelled:
+                    heapq.heappop(self._heap)
+                if self._stopping or not self._heap:
+                    self._thread = None
+                    return None
+
+                now = time.time()
+                wait = self._heap[0].due - now
+                if wait > 0:
+                    self._cond.wait(min(wait, MAX_SLEEP))
+                    continue
+
+                batch = list()
+                horizon = now + self.batch_window
+                while self._heap and self._heap[0].due <= horizon:
+                    job = heapq.heappop(self._heap)
+                    if not job.cancelled:
+                        batch.append(job)
+                return batch
+
+    def _reschedule(self, job, now):
+        if job.every is None or job.cancelled:
+            return
+        # Skip periods that were missed, e.g. while the machine was asleep
+        periods = max(int((now - job.due) // job.every) + 1, 1)
+        job.due += periods * job.every
+        if job.until is not None and job.due > job.until:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, job)
+
+    def _run(self):
+        from fun.communications.communicator import Communicator, COMMUNICATOR_WARN_COLOR, fancy_print
+
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            if self.communicator is None:
+                self.communicator = Communicator()
+            self.communicator.use_session_pool(max_idle=1)
+
+            for job in batch:
+                body, who, subject = job.args
+                try:
+                    job.last_result = self.communicator.send_msg(body, who, subject, **job.kwargs)
+                except Exception as e:
+                    job.last_result = e
+                    msg = f'COMMUNICATOR WARNING: Scheduled message failed: {e}'
+                    fancy_print(msg, fg=COMMUNICATOR_WARN_COLOR)
+                job.runs += 1
+                self._reschedule(job, time.time())
+
+
+def get_scheduler():
+    """Returns the shared scheduler used by ``phone_home(..., send_at=...)``."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
@@ -0,0 +1,86 @@
+"""Pool of open SMTP sessions, so repeated sends skip the connect/TLS/login handshake."""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import threading
+from contextlib import contextmanager
+
+
+class SessionPool(object):
+    """Keeps idle SMTP sessions open for reuse.
+
+    Sessions are checked with ``noop()`` before reuse and replaced if the server dropped them.
+    A session that raises while in use is closed instead of returned to the pool.
+
+    Methods implemented:
+        - `acquire( )` : Context manager yielding an open session.
+        - `close( )` : Quits all idle sessions.
+
+    """
+
+    def __init__(self, factory, max_idle=1):
+        """Initial setup.
+
+        Arguments:
+            factory (callable): Returns a new, logged-in SMTP session.
+            max_idle (int): Optional. Maximum number of idle sessions kept open. Default is 1.
+        """
+        self.factory = factory
+        self.max_idle = max_idle
+        self._idle = list()
+        self._lock = threading.Lock()
+        return
+
+    def __repr__(self):
+        return f'SMTP session pool with {len(self._idle)} idle of max {self.max_idle}'
+
+    @contextmanager
+    def acquire(self):
+        """Yields an open session and returns it to the pool afterwards."""
+        sess = self._checkout()
+        try:
+            yield sess
+        except BaseException:
+            self._discard(sess)
+            raise
+        self._checkin(sess)
+
+    def close(self):
+        """Quits all idle sessions."""
+        with self._lock:
+            idle, self._idle = self._idle, list()
+        for sess in idle:
+            self._discard(sess)
+        return
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                sess = self._idle.pop() if len(self._idle) > 0 else None
+            if sess is None:
+                return self.factory()
+            try:
+                if sess.noop()[0] == 250:
+                    return sess
+            except Exception:
+                pass
+            self._discard(sess)
+
+    def _checkin(self, sess):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(sess)
+                return
+        self._discard(sess)
+
+    @staticmethod
+    def _discard(sess):
+        try:
+            sess.quit()
+        except Exception:
+            try:
+                sess.close()
+            except Exception:
+                pass
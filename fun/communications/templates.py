@@ -0,0 +1,241 @@
+"""Precompiled message templates with per-recipient personalization.
+
+Templates are plain text files named ``<name>_template.txt`` that live next to this module.
+They use ``string.Template`` syntax, e.g. ``${BODY}``.
+
+A template is parsed once into static and variable segments. Binding the per-message fields
+(``BODY``, ``MACHINE``) renders every static run once; only the per-recipient fields
+(e.g. ``FULL_NAME``) are spliced in for each person.
+
+Try:    ``>>> TemplateLibrary().get('alert').bind(BODY='Hi', MACHINE='lab1').render(FULL_NAME='Joe')``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import re
+from pathlib import Path
+from string import Template
+
+
+TEMPLATE_SUFFIX = '_template.txt'
+DEFAULT_TEMPLATE = 'email'
+
+root = Path(__file__).parent.absolute()
+
+# Compiled templates shared by every library, keyed by (path, modification time)
+_compiled_cache = dict()
+
+
+def _to_html(text):
+    """Returns text with line breaks converted to HTML breaks."""
+    return re.sub(r'[\n]', '<br>', text)
+
+
+class CompiledTemplate(object):
+    """A template parsed once into static and variable segments.
+
+    Methods implemented:
+        - `bind( )` : Renders the per-message fields, returns a ``BoundTemplate``.
+        - `substitute( )` : Renders all fields at once, like ``string.Template.substitute()``.
+
+    """
+
+    def __init__(self, name, source):
+        """Parses the template source.
+
+        Arguments:
+            name (str): Name of the template, e.g. 'email'.
+            source (str): Template text using ``string.Template`` syntax.
+        """
+        self.name = name
+        self.source = source
+
+        # Segments alternate between literal strings and field names.
+        # Field names are stored as 1-tuples so they can't be confused with literals.
+        self.segments = list()
+        fields = list()
+
+        literal = list()
+        pos = 0
+        for mo in Template.pattern.finditer(source):
+            literal.append(source[pos:mo.start()])
+            pos = mo.end()
+            if mo.group('escaped') is not None:
+                literal.append(Template.delimiter)
+                continue
+            field = mo.group('named') or mo.group('braced')
+            if field is None:
+                msg = f'Invalid placeholder in template \'{name}\' at position {mo.start("invalid")}'
+                raise ValueError(msg)
+            self.segments.append(''.join(literal))
+            self.segments.append((field,))
+            fields.append(field)
+            literal = list()
+        literal.append(source[pos:])
+        self.segments.append(''.join(literal))
+
+        self.fields = frozenset(fields)
+        return
+
+    def __repr__(self):
+        return f'Compiled template \'{self.name}\' with fields {sorted(self.fields)}'
+
+    def bind(self, **fields):
+        """Renders the given fields once and returns a template for the remaining ones.
+
+        Fields not used by the template are ignored.
+
+        Keyword Arguments:
+            Field names and values, e.g. ``BODY='Hello'``.
+
+        Returns:
+            A ``BoundTemplate``.
+        """
+        return BoundTemplate(self, fields)
+
+    def substitute(self, **fields):
+        """Renders all fields, raising KeyError if any is missing."""
+        return self.bind(**fields).render()
+
+
+class BoundTemplate(object):
+    """A template with its per-message fields already rendered.
+
+    Only the unbound (per-recipient) fields remain. Static text is stored as one prefix and
+    one literal after each remaining field, in both plain text and HTML forms.
+
+    Methods implemented:
+        - `render( )` : Returns plain text for one recipient.
+        - `render_html( )` : Returns HTML body text for one recipient.
+
+    """
+
+    def __init__(self, compiled, fields):
+        """Splices the given fields into the compiled segments.
+
+        Arguments:
+            compiled (CompiledTemplate): The parsed template.
+            fields (dict): Per-message fields.
+        """
+        self.name = compiled.name
+
+        # Merge runs of literals and bound values
+        prefix = list()
+        tail = list()
+        run = prefix
+        for seg in compiled.segments:
+            if isinstance(seg, tuple) and seg[0] not in fields:
+                run = list()
+                tail.append((seg[0], run))
+            elif isinstance(seg, tuple):
+                run.append(str(fields[seg[0]]))
+            else:
+                run.append(seg)
+
+        self.prefix = ''.join(prefix)
+        self.tail = [(f, ''.join(lit)) for f, lit in tail]
+        self.fields = frozenset(f for f, _ in self.tail)
+        self.personalized = len(self.tail) > 0
+
+        self.prefix_html = _to_html(self.prefix)
+        self.tail_html = [(f, _to_html(lit)) for f, lit in self.tail]
+        return
+
+    def __repr__(self):
+        return f'Bound template \'{self.name}\' with fields {sorted(self.fields)}'
+
+    def render(self, **fields):
+        """Returns plain text with the per-recipient fields spliced in.
+
+        Raises:
+            KeyError: If a remaining field is not given.
+        """
+        if not self.personalized:
+            return self.prefix
+        parts = [self.prefix]
+        for f, lit in self.tail:
+            parts.append(str(fields[f]))
+            parts.append(lit)
+        return ''.join(parts)
+
+    def render_html(self, **fields):
+        """Returns HTML body text with the per-recipient fields spliced in.
+
+        Raises:
+            KeyError: If a remaining field is not given.
+        """
+        if not self.personalized:
+            return self.prefix_html
+        parts = [self.prefix_html]
+        for f, lit in self.tail_html:
+            parts.append(_to_html(str(fields[f])))
+            parts.append(lit)
+        return ''.join(parts)
+
+
+class TemplateLibrary(object):
+    """Collection of named templates, compiled on first use and cached.
+
+    Methods implemented:
+        - `get( )` : Returns a ``CompiledTemplate`` by name.
+        - `add( )` : Registers a template from a string.
+        - `names( )` : Lists available template names.
+
+    """
+
+    def __init__(self, directory=None):
+        """Initial setup.
+
+        Arguments:
+            directory (Path): Optional. Folder holding ``<name>_template.txt`` files.
+                Default is the folder of this module.
+        """
+        self.directory = Path(directory) if directory is not None else root
+        self._templates = dict()
+        return
+
+    def __repr__(self):
+        return f'Message templates in {self.directory}'
+
+    def names(self):
+        """Returns a sorted list of available template names."""
+        names = set(self._templates)
+        for p in self.directory.glob('*' + TEMPLATE_SUFFIX):
+            names.add(p.name[:-len(TEMPLATE_SUFFIX)])
+        return sorted(names)
+
+    def add(self, name, source):
+        """Registers a template from a string, replacing any template with the same name.
+
+        Returns:
+            The ``CompiledTemplate``.
+        """
+        self._templates[name] = CompiledTemplate(name, source)
+        return self._templates[name]
+
+    def get(self, name=DEFAULT_TEMPLATE):
+        """Returns the compiled template with the given name.
+
+        Raises:
+            KeyError: If no such template exists.
+        """
+        if name in self._templates:
+            return self._templates[name]
+
+        tgt = self.directory / (name + TEMPLATE_SUFFIX)
+        try:
+            key = (tgt, tgt.stat().st_mtime_ns)
+        except OSError:
+            msg = f'No template named \'{name}\'. Available templates are: {self.names()}'
+            raise KeyError(msg)
+
+        if key not in _compiled_cache:
+            with open(tgt, 'r', encoding='utf-8') as template_file:
+                _compiled_cache[key] = CompiledTemplate(name, template_file.read())
+
+        # Library keeps its own reference; edits to the file require a new library
+        self._templates[name] = _compiled_cache[key]
+        return self._templates[name]
@@ -0,0 +1,337 @@
+"""Webhook channel: deliver messages as JSON over HTTP, with pooled keep-alive connections.
+
+Endpoints are declared in the ``webhooks`` section of ``contact_list.json``, e.g.::
+
+    "webhooks": {
+        "oncall": {"url": "https://alerts.example.com/hooks/fun", "headers": {"Authorization": "Bearer ..."},
+                   "batch": 50, "max_connections": 4}
+    }
+
+Each message is POSTed as a JSON object with the keys subject, body, machine and sent. Endpoints
+that accept a JSON array of such objects can set ``batch`` to the most they accept per request;
+messages sent to them from several threads at about the same time are then grouped into one
+request. Each caller still gets its own delivery result.
+
+Connections are kept open and reused, one pool per host, and ``max_connections`` limits how many
+requests run against a host at the same time. The pool is made for the first endpoint used on a
+host, so its ``max_connections`` and ``timeout`` apply to every endpoint on that host; give
+endpoints on one host the same values.
+
+Try:    ``>>> et.phone_home('Disk full', 'oncall', subject='Alert')``
+Try:    ``>>> et.phone_home('Disk full', 'http://localhost:8080/hook')``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import json
+import threading
+import http.client
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from fun.profiling import profiled
+
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_CONNECTIONS = 4
+
+# Seconds the first message of a batch waits for others to join it
+DEFAULT_LINGER = 0.05
+
+URL_SCHEMES = ('http://', 'https://')
+
+# Shared client, so connections and batches are shared by every Communicator in the process
+_default_client = None
+_default_lock = threading.Lock()
+
+# Errors that mean a kept-alive connection was closed by the server while idle
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                 BrokenPipeError)
+
+
+def is_url(who):
+    """Returns True if `who` looks like an HTTP(S) URL."""
+    return isinstance(who, str) and who.startswith(URL_SCHEMES)
+
+
+class WebhookEndpoint(object):
+    """One webhook: where to POST, with which headers, and how many messages per request.
+
+    Methods implemented:
+        - `body( )` : Returns the encoded request body for one or more payloads.
+
+    """
+
+    def __init__(self, name, url, headers=None, batch=1, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT):
+        """Validates the endpoint.
+
+        Arguments:
+            name (str): Name used in ``who`` and in delivery records.
+            url (str): An http:// or https:// URL.
+            headers (dict): Optional. Extra request headers, e.g. for authorization. Default is None.
+            batch (int): Optional. Most messages per request. Above 1, the endpoint must accept a
+                JSON array of messages. Default is 1 (one message per request, sent as an object).
+            max_connections (int): Optional. Most requests in flight to this host. Endpoints on one
+                host share a pool, and the first one used sets its limit. Default is DEFAULT_MAX_CONNECTIONS.
+            timeout (float): Optional. Seconds to wait for the server. Like `max_connections`, set
+                per host by the first endpoint used. Default is DEFAULT_TIMEOUT.
+        """
+        if not is_url(url):
+            msg = f'Webhook \'{name}\' needs an http:// or https:// URL but you gave {url!r}'
+            raise ValueError(msg)
+        for n, v in (('batch', batch), ('max_connections', max_connections)):
+            if not isinstance(v, int) or v < 1:
+                msg = f'Webhook \'{name}\': \'{n}\' must be a positive integer but you gave {v!r}'
+                raise ValueError(msg)
+
+        parts = urlsplit(url)
+        self.name = name
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self.headers = {'Content-Type': 'application/json', **(headers or dict())}
+        self.batch = batch
+        self.max_connections = max_connections
+        self.timeout = timeout
+        return
+
+    def __repr__(self):
+        return f'Webhook {self.name} at {self.url}'
+
+    @property
+    def pool_key(self):
+        """Endpoints on the same host share one connection pool."""
+        return self.scheme, self.host, self.port
+
+    @property
+    def batch_key(self):
+        """Messages join the same batch only if they go to the same URL with the same headers and batch size."""
+        return self.url, tuple(sorted(self.headers.items())), self.batch
+
+    def body(self, payloads):
+        """Returns the request body: a JSON object for one payload, or an array if batching."""
+        doc = payloads if self.batch > 1 else payloads[0]
+        return json.dumps(doc, separators=(',', ':')).encode('utf-8')
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP connections to one host, with a limit on requests in flight.
+
+    Methods implemented:
+        - `acquire( )` : Context manager yielding a connection; waits while the host is at its limit.
+        - `close( )` : Closes all idle connections.
+
+    """
+
+    def __init__(self, scheme, host, port=None, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT):
+        """Initial setup. Connections are opened on first use.
+
+        Arguments:
+            scheme (str): 'http' or 'https'.
+            host (str): Host name or address.
+            port (int): Optional. Default is the scheme's port.
+            max_connections (int): Optional. Most connections in use at the same time. Default is
+                DEFAULT_MAX_CONNECTIONS.
+            timeout (float): Optional. Socket timeout in seconds. Default is DEFAULT_TIMEOUT.
+        """
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = list()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        return
+
+    def __repr__(self):
+        return f'Connection pool for {self.host} with {len(self._idle)} idle of max {self.max_connections}'
+
+    @contextmanager
+    def acquire(self):
+        """Yields a tuple (connection, reused) and keeps the connection open afterwards."""
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if len(self._idle) > 0 else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                yield conn, reused
+            except BaseException:
+                conn.close()
+                raise
+            with self._lock:
+                self._idle.append(conn)
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, list()
+        for conn in idle:
+            conn.close()
+        return
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+
+class _Batch(object):
+    """Payloads waiting to go out in one request, and the result they share."""
+
+    __slots__ = ('payloads', 'full', 'done', 'error')
+
+    def __init__(self):
+        self.payloads = list()
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.error = None
+
+
+class WebhookClient(object):
+    """Sends payloads to webhook endpoints over pooled connections, batching where allowed.
+
+    Thread-safe; share one client between all senders so they share connections and batches.
+
+    Methods implemented:
+        - `send( )` : Sends one payload and waits for the result, joining a batch if the endpoint allows.
+        - `post( )` : Sends a list of payloads as a single request.
+        - `close( )` : Closes all idle connections.
+
+    """
+
+    def __init__(self, linger=DEFAULT_LINGER):
+        """Initial setup.
+
+        Arguments:
+            linger (float): Optional. Seconds the first message of a batch waits for more to join.
+                Default is DEFAULT_LINGER.
+        """
+        self.linger = linger
+        self.pools = dict()
+        self._batches = dict()
+        self._lock = threading.Lock()
+        return
+
+    def __repr__(self):
+        return f'Webhook client with {len(self.pools)} connection pools'
+
+    def send(self, endpoint, payload, retries=0):
+        """Sends one payload. Returns None on success, otherwise a string describing the last error.
+
+        For endpoints with ``batch`` above 1, the payload joins an open batch for the same URL and headers.
+        The batch goes out when it is full or `linger` seconds after it was opened, and every
+        payload in it gets the result of that one request. The first caller's `retries` is used.
+
+        Arguments:
+            endpoint (WebhookEndpoint): Where to send.
+            payload (dict): JSON-serializable message.
+            retries (int): Optional. Number of extra attempts if the request fails. Default is 0.
+        """
+        if endpoint.batch <= 1:
+            return self.post(endpoint, [payload], retries)
+
+        key = endpoint.batch_key
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = _Batch()
+            batch.payloads.append(payload)
+            if len(batch.payloads) >= endpoint.batch:
+                del self._batches[key]  # Closed; later payloads open a new batch
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+            return batch.error
+
+        batch.full.wait(self.linger)
+        with self._lock:
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+        try:
+            batch.error = self.post(endpoint, batch.payloads, retries)
+        finally:
+            batch.done.set()
+        return batch.error
+
+    @profiled('webhook.post')
+    def post(self, endpoint, payloads, retries=0):
+        """Sends payloads as a single request, trying up to `retries` extra times.
+
+        A kept-alive connection that the server closed while idle is replaced once without
+        counting as a retry.
+
+        Returns:
+            None on success, otherwise a string describing the last error.
+        """
+        body = endpoint.body(payloads)
+        pool = self._pool(endpoint)
+        error = None
+        for _ in range(retries + 1):
+            try:
+                status, reason = self._request(pool, endpoint, body)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                continue
+            if status < 300:
+                return None
+            error = f'HTTPError: {status} {reason}'
+        return error
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            pools = list(self.pools.values())
+        for p in pools:
+            p.close()
+        return
+
+    def _pool(self, endpoint):
+        # One pool per host, with the limits of the first endpoint seen there
+        key = endpoint.pool_key
+        pool = self.pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self.pools.get(key)
+                if pool is None:
+                    pool = self.pools[key] = ConnectionPool(*key, max_connections=endpoint.max_connections,
+                                                            timeout=endpoint.timeout)
+        return pool
+
+    @staticmethod
+    def _request(pool, endpoint, body):
+        """Returns (status, reason) of one POST. The response is read fully so the connection can be reused."""
+        with pool.acquire() as (conn, reused):
+            try:
+                conn.request('POST', endpoint.path, body=body, headers=endpoint.headers)
+                response = conn.getresponse()
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle connection; a closed connection reopens on request
+                conn.close()
+                conn.request('POST', endpoint.path, body=body, headers=endpoint.headers)
+                response = conn.getresponse()
+            response.read()
+            if response.will_close:
+                conn.close()
+            return response.status, response.reason
+
+
+def get_client():
+    """Returns the shared webhook client used by ``Communicator.send_msg()``."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = WebhookClient()
+        return _default_client
@@ -0,0 +1,504 @@
+"""Compact, column-oriented record store for the tables we print and email.
+
+Each column is one typed array, so a million rows of a few numbers and a short string take
+tens of MB instead of the hundreds a list of dicts or tuples would.
+
+    * 'int' columns are 64-bit integers, 'float' columns 64-bit floats, 'bool' columns bytes.
+    * 'str' columns are one UTF-8 blob plus an array of offsets; values are decoded on access.
+
+Rows go in one at a time or, much faster, in batches. Rows come out as lightweight views that
+read straight from the columns. Slicing returns a view of the same memory, and numeric columns
+are exposed as ``memoryview`` objects (``numpy.frombuffer`` accepts them as-is).
+
+A store can be saved to disk and loaded back memory-mapped, so opening a large file is instant
+and only the pages that are read are loaded.
+
+Try:    ``>>> d = Data({'user': 'str', 'sent': 'int', 'secs': 'float'})``
+Try:    ``>>> d.extend([('alice', 3, 0.25), ('bob', 12, 1.5)]); d.print_table()``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import io
+import sys
+from array import array
+from itertools import islice
+
+
+# Column type -> array typecode; strings have their own layout
+TYPES = {'int': 'q', 'float': 'd', 'bool': 'b', 'str': None}
+
+# Rows converted to columns at a time by extend(); bounds memory for generators
+DEFAULT_BATCH_SIZE = 10000
+
+MAGIC = b'FUNDATA1'
+_ALIGN = 8
+
+
+class _StrColumn(object):
+    """UTF-8 blob plus offsets: value i is blob[offsets[i]:offsets[i + 1]]."""
+
+    __slots__ = ('offsets', 'blob')
+
+    def __init__(self, offsets=None, blob=None):
+        self.offsets = offsets if offsets is not None else array('q', [0])
+        self.blob = blob if blob is not None else bytearray()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def extend(self, values):
+        encoded = [('' if v is None else v if isinstance(v, str) else str(v)).encode('utf-8') for v in values]
+        base = self.offsets[-1]
+        self.blob += b''.join(encoded)
+        self.offsets.extend(_running(base, encoded))
+
+    def truncate(self, n):
+        del self.blob[self.offsets[n]:]
+        del self.offsets[n + 1:]
+
+
+def _decode(col, start, stop):
+    """Yields the strings of a string column from start to stop."""
+    blob = col.blob
+    offsets = islice(col.offsets, start, stop + 1)
+    a = next(offsets)
+    for b in offsets:
+        yield str(blob[a:b], 'utf-8')
+        a = b
+
+
+def _running(base, encoded):
+    """Yields the end offset of each encoded value."""
+    for e in encoded:
+        base += len(e)
+        yield base
+
+
+class Row(object):
+    """A view of one row. Values are read from the columns on access, by position or name.
+
+    Try:    ``>>> row['user'], row[0], row.user``
+
+    """
+
+    __slots__ = ('_data', '_index')
+
+    def __init__(self, data, index):
+        self._data = data
+        self._index = index
+
+    def __repr__(self):
+        values = ', '.join(f'{k}={v!r}' for k, v in zip(self._data.columns, self))
+        return f'Row({values})'
+
+    def __len__(self):
+        return len(self._data.columns)
+
+    def __iter__(self):
+        d = self._data
+        i = self._index
+        return (d._cell(c, i) for c in d.columns)
+
+    def __getitem__(self, key):
+        d = self._data
+        if isinstance(key, int):
+            key = d.columns[key]
+        return d._cell(key, self._index)
+
+    def __getattr__(self, name):
+        try:
+            return self._data._cell(name, self._index)
+        except KeyError:
+            raise AttributeError(f'Row has no column {name!r}') from None
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            other = tuple(other)
+        return tuple(self) == other
+
+    def as_tuple(self):
+        return tuple(self)
+
+    def as_dict(self):
+        return dict(zip(self._data.columns, self))
+
+
+class Data(object):
+    """Column-oriented record store.
+
+    Methods implemented:
+        - `append( )` : Adds one row.
+        - `extend( )` : Adds many rows, a batch at a time.
+        - `column( )` : Returns a column; numeric columns as zero-copy memoryviews.
+        - `rows( )` : Yields rows as tuples.
+        - `print_table( )` : Prints the rows with ``fun.printing.table``.
+        - `to_csv( )` : Writes CSV to a file or stream; `csv_bytes( )` returns it, for attachments.
+        - `save( )` / `load( )` : Stores to disk and loads back, optionally memory-mapped.
+
+    Indexing gives a ``Row`` view; slicing (step 1) gives a read-only ``Data`` view of the same memory.
+
+    """
+
+    def __init__(self, columns=None, name='data'):
+        """Initial setup.
+
+        Arguments:
+            columns (obj): Optional. Dict of name -> type, or list of (name, type) pairs. Types are
+                'int', 'float', 'bool', and 'str'. Default is None: columns are named 'c0', 'c1', ...
+                (or after the keys of dict rows) and typed from the first row added.
+            name (str): Optional. Used for file names, e.g. of CSV attachments. Default is 'data'.
+        """
+        self.name = name
+        self.columns = list()
+        self.types = dict()
+        self._cols = dict()
+        self._start = 0
+        self._stop = None
+        self._readonly = False
+        self._mmap = None
+
+        if columns is not None:
+            items = columns.items() if isinstance(columns, dict) else columns
+            for col, typ in items:
+                self._add_column(col, typ)
+        return
+
+    def __repr__(self):
+        cols = ', '.join(f'{c} ({self.types[c]})' for c in self.columns)
+        return f'Data \'{self.name}\': {len(self)} rows of {cols or "no columns"}'
+
+    def __len__(self):
+        if self._stop is not None:
+            return self._stop - self._start
+        if not self.columns:
+            return 0
+        return len(self._cols[self.columns[0]]) - self._start
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Row(self, i)
+
+    def __getitem__(self, key):
+        n = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(n)
+            if step != 1:
+                msg = 'Data slices must be contiguous (step 1)'
+                raise ValueError(msg)
+            view = Data(name=self.name)
+            view.columns = self.columns
+            view.types = self.types
+            view._cols = self._cols
+            view._start = self._start + start
+            view._stop = self._start + max(stop, start)
+            view._readonly = True
+            view._mmap = self._mmap
+            return view
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError('Data index out of range')
+        return Row(self, key)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the columns."""
+        total = 0
+        for col in self._cols.values():
+            if isinstance(col, _StrColumn):
+                total += memoryview(col.offsets).nbytes + len(col.blob)
+            else:
+                total += memoryview(col).nbytes
+        return total
+
+    def _add_column(self, name, typ):
+        if typ not in TYPES:
+            msg = f'\'{typ}\' is not a valid column type. Valid types are: {list(TYPES)}'
+            raise ValueError(msg)
+        if name in self.types:
+            msg = f'Column \'{name}\' already exists'
+            raise KeyError(msg)
+        self.columns.append(name)
+        self.types[name] = typ
+        self._cols[name] = _StrColumn() if typ == 'str' else array(TYPES[typ])
+
+    def _infer_columns(self, row):
+        if isinstance(row, dict):
+            items = row.items()
+        else:
+            items = ((f'c{i}', v) for i, v in enumerate(row))
+        for name, v in items:
+            if isinstance(v, bool):
+                typ = 'bool'
+            elif isinstance(v, int):
+                typ = 'int'
+            elif isinstance(v, float):
+                typ = 'float'
+            else:
+                typ = 'str'
+            self._add_column(name, typ)
+
+    def _cell(self, name, i):
+        col = self._cols[name]
+        v = col[self._start + i]
+        return bool(v) if self.types[name] == 'bool' else v
+
+    def append(self, row):
+        """Adds one row: a sequence in column order, or a dict keyed by column name."""
+        self.extend((row,))
+        return
+
+    def extend(self, rows, batch_size=DEFAULT_BATCH_SIZE):
+        """Adds many rows. Rows are turned into columns a batch at a time, then each column is
+        extended in one call. A batch that fails leaves the store as it was before that batch.
+
+        Arguments:
+            rows (iterable): Sequences in column order, or dicts keyed by column name.
+            batch_size (int): Optional. Rows converted at a time. Default is DEFAULT_BATCH_SIZE.
+
+        Returns:
+            Number of rows added.
+        """
+        if self._readonly:
+            msg = 'This Data is a read-only view or memory-mapped file; it cannot grow'
+            raise TypeError(msg)
+
+        added = 0
+        it = iter(rows)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                return added
+            if not self.columns:
+                self._infer_columns(batch[0])
+            self._extend_batch(batch)
+            added += len(batch)
+
+    def _extend_batch(self, batch):
+        names = self.columns
+        width = len(names)
+        if isinstance(batch[0], dict):
+            values = [[r.get(c) for r in batch] for c in names]
+        else:
+            if any(len(r) != width for r in batch):
+                msg = f'Every row must have {width} values'
+                raise ValueError(msg)
+            values = list(zip(*batch))
+
+        # An array can't grow while a memoryview from column() holds it; find out before changing anything
+        for name in names:
+            col = self._cols[name]
+            if not isinstance(col, _StrColumn):
+                try:
+                    del col[len(col):]
+                except BufferError as e:
+                    msg = (f'Column \'{name}\' is held by a memoryview from column(); release it '
+                           f'(del or .release()) before adding rows')
+                    raise BufferError(msg) from e
+
+        before = len(self._cols[names[0]])
+        try:
+            for name, vals in zip(names, values):
+                col = self._cols[name]
+                if self.types[name] == 'float':
+                    col.extend(float('nan') if v is None else v for v in vals)
+                else:
+                    col.extend(vals)
+        except Exception as e:
+            for name in names:
+                col = self._cols[name]
+                if len(col) <= before:
+                    continue
+                if isinstance(col, _StrColumn):
+                    col.truncate(before)
+                else:
+                    del col[before:]
+            if isinstance(e, (TypeError, OverflowError)):
+                msg = f'Could not add rows: {e}. Column types are: {self.types}'
+                raise TypeError(msg) from e
+            raise
+
+    def column(self, name):
+        """Returns a column. Numeric columns are memoryviews of the store (no copy); strings are a list.
+
+        While a memoryview is held, rows can't be added: `extend( )` raises BufferError. Release
+        it first with ``del`` or ``.release()``, or copy it with ``.tolist()``.
+
+        Arguments:
+            name (str): Column name.
+        """
+        col = self._cols[name]
+        stop = self._start + len(self)
+        if isinstance(col, _StrColumn):
+            return [col[i] for i in range(self._start, stop)]
+        return memoryview(col)[self._start:stop]
+
+    def rows(self):
+        """Yields rows as tuples, decoded column by column."""
+        s, e = self._start, self._start + len(self)
+        its = list()
+        for name in self.columns:
+            col = self._cols[name]
+            if isinstance(col, _StrColumn):
+                its.append(_decode(col, s, e))
+            elif self.types[name] == 'bool':
+                its.append(map(bool, islice(col, s, e)))
+            else:
+                its.append(islice(col, s, e))
+        return zip(*its)
+
+    def print_table(self, stream=None, **kwargs):
+        """Prints the rows as an aligned table, streamed. See ``fun.printing.table.Table``.
+
+        Arguments:
+            stream (file): Optional. Text stream to write to. Default is the shared printer's stream.
+
+        Keyword Arguments:
+            Passed to ``Table()``.
+
+        Returns:
+            Number of lines written.
+        """
+        from fun.printing.table import Table
+
+        return Table(columns=self.columns, **kwargs).print(self.rows(), stream)
+
+    def to_csv(self, target=None):
+        """Writes the rows as CSV, with a header line.
+
+        Arguments:
+            target (obj): Optional. Path or text stream. Default is None: returns the CSV as a string.
+        """
+        import csv
+
+        if target is None:
+            buf = io.StringIO()
+            self.to_csv(buf)
+            return buf.getvalue()
+        if hasattr(target, 'write'):
+            w = csv.writer(target)
+            w.writerow(self.columns)
+            w.writerows(self.rows())
+            return None
+        with open(target, 'w', newline='', encoding='utf-8') as f:
+            self.to_csv(f)
+        return None
+
+    def csv_bytes(self):
+        """Returns the rows as UTF-8 CSV, e.g. for an email attachment."""
+        return self.to_csv().encode('utf-8')
+
+    def save(self, path):
+        """Saves to a file that `load( )` can memory-map.
+
+        Arguments:
+            path (Path): Where to save.
+        """
+        import json
+
+        n = len(self)
+        s, e = self._start, self._start + n
+
+        # Pieces of each column as (name, part, bytes); strings store offsets rebased to 0
+        blobs = list()
+        for name in self.columns:
+            col = self._cols[name]
+            if isinstance(col, _StrColumn):
+                lo, hi = col.offsets[s], col.offsets[e]
+                offsets = array('q', (o - lo for o in col.offsets[s:e + 1]))
+                blobs.append((name, 'offsets', memoryview(offsets).cast('B')))
+                blobs.append((name, 'blob', memoryview(col.blob)[lo:hi]))
+            else:
+                blobs.append((name, 'values', memoryview(col)[s:e].cast('B')))
+
+        meta = dict(name=self.name, rows=n, byteorder=sys.byteorder,
+                    columns=[dict(name=c, type=self.types[c]) for c in self.columns], parts=list())
+        header_len = 4096
+        while True:
+            pos = len(MAGIC) + 8 + header_len
+            parts = list()
+            for name, part, mv in blobs:
+                pos += -pos % _ALIGN
+                parts.append(dict(column=name, part=part, offset=pos, nbytes=mv.nbytes))
+                pos += mv.nbytes
+            meta['parts'] = parts
+            header = json.dumps(meta).encode('utf-8')
+            if len(header) <= header_len:
+                break
+            header_len = len(header) + 4096
+
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(header_len.to_bytes(8, 'little'))
+            f.write(header.ljust(header_len, b' '))
+            for (name, part, mv), p in zip(blobs, parts):
+                f.write(b'\0' * (p['offset'] - f.tell()))
+                f.write(mv)
+        return
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Loads a file written by `save( )`.
+
+        Arguments:
+            path (Path): File to load.
+            mmap (bool): Optional. If True, columns are read straight from a read-only memory map
+                and the result cannot grow. If False, columns are copied into memory. Default is True.
+        """
+        import json
+        import mmap as mmap_
+
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                msg = f'\'{path}\' is not a saved Data file'
+                raise ValueError(msg)
+            header_len = int.from_bytes(f.read(8), 'little')
+            meta = json.loads(f.read(header_len).decode('utf-8'))
+
+            if mmap and meta['byteorder'] != sys.byteorder:
+                mmap = False  # Needs byte swapping, so it can't be used in place
+            if mmap:
+                buf = memoryview(mmap_.mmap(f.fileno(), 0, access=mmap_.ACCESS_READ))
+            else:
+                f.seek(0)
+                buf = memoryview(f.read())
+
+        d = cls(name=meta['name'])
+        d.columns = [c['name'] for c in meta['columns']]
+        d.types = {c['name']: c['type'] for c in meta['columns']}
+        parts = {(p['column'], p['part']): buf[p['offset']:p['offset'] + p['nbytes']] for p in meta['parts']}
+        swap = meta['byteorder'] != sys.byteorder
+
+        for name in d.columns:
+            typ = d.types[name]
+            if typ == 'str':
+                offsets = parts[(name, 'offsets')]
+                blob = parts[(name, 'blob')]
+                if mmap:
+                    d._cols[name] = _StrColumn(offsets.cast('q'), blob)
+                else:
+                    d._cols[name] = _StrColumn(_to_array('q', offsets, swap), bytearray(blob))
+            else:
+                values = parts[(name, 'values')]
+                d._cols[name] = values.cast(TYPES[typ]) if mmap else _to_array(TYPES[typ], values, swap)
+
+        if mmap:
+            d._readonly = True
+            d._mmap = buf
+            d._stop = meta['rows']
+        return d
+
+
+def _to_array(typecode, mv, swap):
+    a = array(typecode)
+    a.frombytes(mv)
+    if swap:
+        a.byteswap()
+    return a
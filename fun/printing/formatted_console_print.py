@@ -8,17 +8,86 @@ No idea about other consoles!
 
 Try:    ``>>> p = FancyPrinter().demo()``
 
+In hot loops, validate the options once and reuse the result:
+
+Try:    ``>>> warn = compile_style(fg='warning'); warn.write('Careful!')``
+
+Output can go to any text stream, optionally buffered. Batches become a single write:
+
+Try:    ``>>> with FancyPrinter(stream=log_file, flush_policy='size') as p: ...``
+Try:    ``>>> with p.batch(): ...``
+
+Colors are downsampled to what the console can show (24-bit, 256, 16, or none). Output to files
+and pipes gets no escape codes unless the environment variable ``FUN_COLOR`` says otherwise.
+See ``fun.printing.terminal``.
+
 """
 
 __author__ = "Christopher Couch"
 __license__ = "MIT"
 __version__ = "2020-06"
 
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+
+from fun import profiling
+from fun.profiling import profiled, span
+from fun.printing.sinks import BufferedSink, DEFAULT_BUFFER_SIZE, DEFAULT_FLUSH_INTERVAL
+from fun.printing.terminal import COLOR_DEPTHS, detect_color_depth, sgr_color
+
+
+VALID_KWARGS = (
+    'fg',
+    'bg',
+    'bold',
+    'underscore',
+    'italic',
+    'strikethrough',
+    'framed',
+    'highlight',
+    'header',
+    'end',
+)
+_valid_kwargs = frozenset(VALID_KWARGS)
+
+RESET = '\x1b[0m'
+HEADER_RULE = '=' * 80
+
+# Shared printer used by the module-level fancy_print()
+_printer = None
+
 
 class FancyPrinter(object):
 
-    def __init__(self):
-        """Defines color dictionary."""
+    def __init__(self, stream=None, flush_policy=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, color_depth=None):
+        """Defines color dictionary, output stream, and color depth.
+
+        Arguments:
+            stream (file): Optional. Text stream to print to. Default is sys.stdout at print time.
+            flush_policy (str): Optional. If given, output is buffered and flushed by this policy:
+                'line', 'size', 'interval', or 'explicit'. See ``fun.printing.sinks.BufferedSink``.
+                Default is None (no buffering; one write per line).
+            buffer_size (int): Optional. Characters held before a 'size' or 'interval' flush.
+            flush_interval (float): Optional. Seconds between 'interval' flushes.
+            color_depth (str): Optional. 'truecolor', '256', '16', or 'none'.
+                Default is None (detected once from the stream; see ``fun.printing.terminal``).
+        """
+
+        if color_depth is None:
+            color_depth = detect_color_depth(stream)
+        if color_depth not in COLOR_DEPTHS:
+            msg = f'\'{color_depth}\' is not a valid color depth. Valid depths are: {list(COLOR_DEPTHS)}'
+            raise ValueError(msg)
+        self.color_depth = color_depth
+
+        # A sink made here is closed by close( ); a stream passed in is only flushed
+        self._owns_stream = flush_policy is not None
+        if flush_policy is not None:
+            stream = BufferedSink(stream, flush_policy=flush_policy, buffer_size=buffer_size,
+                                  flush_interval=flush_interval)
+        self.stream = stream
 
         # RGB values
         dk = 64
@@ -109,6 +178,15 @@ class FancyPrinter(object):
             warning=(255, 255, 0),  # yellow
             error=(255, max(wash1 - 50, 0), max(wash1 - 50, 0)),  # light_red
         )
+
+        # SGR color parameters for the named colors at this printer's color depth
+        self.fg_codes = {c: sgr_color(rgb, color_depth) for c, rgb in self.rgb_dict.items()}
+        self.bg_codes = {c: sgr_color(rgb, color_depth, background=True) for c, rgb in self.rgb_dict.items()}
+
+        # Escape sequences are built once per combination of options, then reused.
+        # typed=True so that e.g. bold=1 is validated instead of hitting the entry for bold=True.
+        self._escape_pair = lru_cache(maxsize=256, typed=True)(self._build_escape_pair)
+        self._compiled_style = lru_cache(maxsize=256, typed=True)(self._compile_style)
         return
 
     def __repr__(self):
@@ -117,6 +195,12 @@ class FancyPrinter(object):
     def __call__(self, *args, **kwargs):
         self.fancy_print(*args, **kwargs)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def fancy_print(self, string='Default message', **kwargs):
         """Prints text to console using a variety of formatting methods.
 
@@ -143,7 +227,9 @@ class FancyPrinter(object):
 
         Keyword Arguments:
             fg (str): Optional. Foreground color. If omitted, the standard terminal color will be used.
+                Also accepts any color as an (R, G, B) tuple or a '#rrggbb' string.
             bg (str): Optional. Background color. If omitted, the standard terminal color will be used.
+                Also accepts any color as an (R, G, B) tuple or a '#rrggbb' string.
             bold (Boolean): Optional. Default is False.
             underscore (Boolean): Optional. Default is False.
             italic (Boolean): Optional. Default is False.
@@ -161,38 +247,107 @@ class FancyPrinter(object):
         # This means we can actually accept most objects.
         string = str(string) if not isinstance(string, str) else string
 
+        # Public flag check rather than @profiled: forwarding the keyword arguments adds about a fifth per call
+        if not profiling.is_enabled():
+            self.compile_style(**kwargs).write(string, self.stream)
+            return
+        with span('fancy_print'):
+            self.compile_style(**kwargs).write(string, self.stream)
+        return
+
+    def flush(self):
+        """Flushes any buffered output."""
+        stream = sys.stdout if self.stream is None else self.stream
+        if hasattr(stream, 'flush'):
+            stream.flush()
+        return
+
+    def close(self):
+        """Flushes buffered output, and closes the buffer made for `flush_policy`.
+
+        Call this, or use the printer in a ``with`` block, before closing the stream it writes to.
+        The stream itself is left open.
+        """
+        if self._owns_stream and isinstance(self.stream, BufferedSink):
+            self.stream.close()
+        else:
+            self.flush()
+        return
+
+    @contextmanager
+    def batch(self):
+        """Context manager that collects everything printed inside it into one write.
+
+        Not thread-safe when the printer has no buffered stream: other threads printing
+        through this printer during the batch are collected into it too.
+        """
+        if isinstance(self.stream, BufferedSink):
+            with self.stream.batch():
+                yield self
+            return
+
+        stream = self.stream
+        self.stream = BufferedSink(stream, flush_policy='explicit')
+        try:
+            yield self
+        finally:
+            self.stream.close()
+            self.stream = stream
+
+    def compile_style(self, **kwargs):
+        """Validates formatting options once and returns a reusable ``Style``.
+
+        Styles are cached, so compiling the same options again is cheap.
+
+        Keyword Arguments:
+            Same as `fancy_print( )`.
+
+        Returns:
+            An immutable ``Style``.
+        """
+        return self._compiled_style(**kwargs)
+
+    def _compile_style(self, **kwargs):
+        """Builds a ``Style``. Called through the cache in ``self._compiled_style``."""
+
+        # Validate kwargs
+        if not _valid_kwargs.issuperset(kwargs):
+            k = next(k for k in kwargs if k not in _valid_kwargs)
+            msg = f'\'{k}\' is not a valid keyword argument. Valid keywords are: {list(VALID_KWARGS)}'
+            raise KeyError(msg)
+
         # Parse kwargs
-        f = kwargs.get('fg', 'normal')
-        b = kwargs.get('bg', 'normal')
-        bold = kwargs.get('bold', False)
-        underscore = kwargs.get('underscore', False)
-        italic = kwargs.get('italic', False)
-        strikethrough = kwargs.get('strikethrough', False)
-        framed = kwargs.get('framed', False)
-        highlight = kwargs.get('highlight', False)
         header = kwargs.get('header', False)
         end = kwargs.get('end', None)
 
-        # Validate kwargs
-        valid_kwargs = [
-            'fg',
-            'bg',
-            'bold',
-            'underscore',
-            'italic',
-            'strikethrough',
-            'framed',
-            'highlight',
-            'header',
-            'end',
-        ]
-        for k in kwargs:
-            if k not in valid_kwargs:
-                msg = f'\'{k}\' is not a valid keyword argument. Valid keywords are: {valid_kwargs}'
-                raise KeyError(msg)
+        if not isinstance(header, bool):
+            msg = f'\'b\' must be Boolean but you gave type: {type(header)}'
+            raise TypeError(msg)
+
+        prefix, suffix = self._escape_pair(
+            kwargs.get('fg', 'normal'),
+            kwargs.get('bg', 'normal'),
+            kwargs.get('bold', False),
+            kwargs.get('underscore', False),
+            kwargs.get('italic', False),
+            kwargs.get('strikethrough', False),
+            kwargs.get('framed', False),
+            kwargs.get('highlight', False),
+        )
+
+        end = '\n' if end is None else end
+        return Style(self, kwargs, prefix, suffix, header, end)
+
+    # Inside the cache, so the span counts only the combinations built, not every lookup
+    @profiled('fancy_print.escapes_built')
+    def _build_escape_pair(self, f, b, bold, underscore, italic, strikethrough, framed, highlight):
+        """Returns the (prefix, suffix) escape sequences for one combination of options.
+
+        Called through the cache in ``self._escape_pair``; see `fancy_print( )` for the arguments.
+        """
 
         # Validate booleans
-        for my_bool in [bold, underscore, italic, strikethrough, framed, highlight, header]:
+        for my_bool in [bold, underscore, italic, strikethrough, framed, highlight]:
             if not isinstance(my_bool, bool):
                 msg = f'\'b\' must be Boolean but you gave type: {type(my_bool)}'
                 raise TypeError(msg)
@@ -206,16 +361,10 @@ class FancyPrinter(object):
             f = 'black'
             b = 'yellow'
 
-        # Handle header option
-        if header:
-            string = '\n' + '='*80 + '\n' + string + '\n' + '='*80 + '\n'
-
         # =========================================================
         # Special foreground "color" options
         # =========================================================
 
-        special_color_list = ['normal', 'hlink', 'warning', 'error']
-
         # Handle normal option
         if f == 'normal':
             # Just use the RGB values from dict
@@ -240,27 +389,15 @@ class FancyPrinter(object):
             bold = True
 
         # =========================================================
-        # Validate
+        # Validate and process color selections
         # =========================================================
 
-        # Validate selections
-        if f not in self.rgb_dict:
-            raise RuntimeError(f'Foreground color selection \'{f}\' is invalid. '
-                               f'Please choose one of:\n{list(self.rgb_dict.keys())}')
-        # Validate selections
-        if b not in self.rgb_dict:
-            raise RuntimeError(f'Background color selection \'{b}\' is invalid. '
-                               f'Please choose one of:\n{list(self.rgb_dict.keys())}')
-
-        # =========================================================
-        # Process
-        # =========================================================
+        fg_code = self._color_code(f, 'Foreground', self.fg_codes, False)
+        bg_code = self._color_code(b, 'Background', self.bg_codes, True)
 
-        # Process color selections
-        f_tuple = self.rgb_dict[f]
-        b_tuple = self.rgb_dict[b]
-        fR, fG, fB = f_tuple[0], f_tuple[1], f_tuple[2]
-        bR, bG, bB = b_tuple[0], b_tuple[1], b_tuple[2]
+        # No escape codes at all for plain output
+        if self.color_depth == 'none':
+            return '', ''
 
         # Build list of formatting attributes
         attributes = list()
@@ -273,47 +410,63 @@ class FancyPrinter(object):
         code = ';'.join(attributes)
         code = ';' + code if len(code) > 0 else code
 
-        # Build final string for console print using 24-bit (True Color)
+        # Build final escape sequences; 24-bit (True Color) unless downsampled
         if f != 'normal' and b != 'normal':
-            new_str = f'\x1b[38;2;{fR};{fG};{fB}{code};48;2;{bR};{bG};{bB}m{string}\x1b[0m'
+            prefix = f'\x1b[{fg_code}{code};{bg_code}m'
         elif f == 'normal' and b != 'normal':
-            new_str = f'\x1b[{code};48;2;{bR};{bG};{bB}m{string}\x1b[0m'
+            prefix = f'\x1b[{code};{bg_code}m'
         elif f != 'normal' and b == 'normal':
-            new_str = f'\x1b[38;2;{fR};{fG};{fB}{code}m{string}\x1b[0m'
+            prefix = f'\x1b[{fg_code}{code}m'
         else:
-            new_str = f'\x1b[{code}m{string}\x1b[0m'
-
-        # Print to console
-        print(new_str, end=end)
-
-        return
+            prefix = f'\x1b[{code}m'
+
+        return prefix, RESET
+
+    def _color_code(self, color, layer, codes, background):
+        """Returns SGR color parameters for a color name, (R, G, B) tuple, or '#rrggbb' string."""
+        if isinstance(color, str) and color in codes:
+            return codes[color]
+
+        rgb = None
+        if isinstance(color, str) and len(color) == 7 and color[0] == '#':
+            try:
+                rgb = (int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16))
+            except ValueError:
+                rgb = None
+        elif isinstance(color, tuple) and len(color) == 3:
+            if all(isinstance(v, int) and 0 <= v <= 255 for v in color):
+                rgb = color
+
+        if rgb is None:
+            raise RuntimeError(f'{layer} color selection \'{color}\' is invalid. '
+                               f'Please choose an (R, G, B) tuple, a \'#rrggbb\' string, or one of:\n'
+                               f'{list(self.rgb_dict.keys())}')
+        return sgr_color(rgb, self.color_depth, background)
 
     def demo(self, string='Foo Fighters Rule'):
-        """Prints a demo to console."""
+        """Prints a demo to console. Each demo line is a single write."""
 
         special_fg_colors = ['normal', 'hlink', 'warning', 'error']
+        out = sys.stdout if self.stream is None else self.stream
 
         self.fancy_print('FOREGROUND COLORS', fg='light_cerulean', header=True)
 
         # Show all colors - foreground
         for c in self.rgb_dict:
             if c not in special_fg_colors:
-                print(f'\t> {c}: '.ljust(25, ' '), end='')
-                self.fancy_print(string, fg=c, bold=True)
+                out.write(f'\t> {c}: '.ljust(25, ' ') + self.compile_style(fg=c, bold=True).format(string) + '\n')
 
         self.fancy_print('BACKGROUND COLORS', fg='light_cerulean', header=True)
 
         # Show all colors - background
         for c in self.rgb_dict:
             if c not in special_fg_colors:
-                print(f'\t> {c}:'.ljust(25, ' '), end='')
-                self.fancy_print(string, fg='light_grey', bg=c, bold=False)
+                out.write(f'\t> {c}:'.ljust(25, ' ') + self.compile_style(fg='light_grey', bg=c).format(string) + '\n')
 
         # Show special "colors" with additional treatments
         self.fancy_print('SPECIAL FOREGROUND COLORS WITH AUTOMATIC TREATMENTS', fg='light_cerulean', header=True)
         for c in special_fg_colors:
-            print(f'\t> {c}:'.ljust(25, ' '), end='')
-            self.fancy_print(string, fg=c)
+            out.write(f'\t> {c}:'.ljust(25, ' ') + self.compile_style(fg=c).format(string) + '\n')
 
         self.fancy_print('FORMATTING WITH BOOLEAN FLAGS', fg='light_cerulean', header=True)
 
@@ -321,12 +474,117 @@ class FancyPrinter(object):
         options = ['bold', 'italic', 'underscore', 'strikethrough', 'framed', 'highlight']
         for o in options:
             kwarg_dict = {'fg': 'light_cerulean', o: True}
-            print(f'\t> {o}:'.ljust(25, ' '), end='')
-            self.fancy_print(string, **kwarg_dict)
+            out.write(f'\t> {o}:'.ljust(25, ' ') + self.compile_style(**kwarg_dict).format(string) + '\n')
 
         return
 
 
+class Style(object):
+    """Formatting options validated once, ready to apply to any text.
+
+    Build one with ``compile_style()`` or ``FancyPrinter.compile_style()``. Styles are immutable.
+    Adding two styles gives a new style where options of the right-hand style win.
+
+    Methods implemented:
+        - `format( )` : Returns the styled text as a string.
+        - `write( )` : Writes the styled text, plus `end`, to a stream.
+
+    """
+
+    __slots__ = ('printer', 'options', 'prefix', 'suffix', 'header', 'end')
+
+    def __init__(self, printer, options, prefix, suffix, header, end):
+        set_ = object.__setattr__
+        set_(self, 'printer', printer)
+        set_(self, 'options', tuple(options.items()))
+        set_(self, 'prefix', prefix)
+        set_(self, 'suffix', suffix)
+        set_(self, 'header', header)
+        set_(self, 'end', end)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Style objects are immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError('Style objects are immutable')
+
+    def __repr__(self):
+        options = ', '.join(f'{k}={v!r}' for k, v in self.options)
+        return f'Style({options})'
+
+    def __add__(self, other):
+        if not isinstance(other, Style):
+            return NotImplemented
+        options = dict(self.options)
+        options.update(other.options)
+        return self.printer.compile_style(**options)
+
+    def format(self, text):
+        """Returns the styled text, without `end`."""
+        text = str(text) if not isinstance(text, str) else text
+        if self.header:
+            text = '\n' + HEADER_RULE + '\n' + text + '\n' + HEADER_RULE + '\n'
+        return f'{self.prefix}{text}{self.suffix}'
+
+    def write(self, text, stream=None):
+        """Writes the styled text, plus `end`, with a single write.
+
+        Arguments:
+            text (obj): The text to write. Objects are converted using str(object).
+            stream (file): Optional. Text stream to write to. Default is sys.stdout.
+        """
+        text = str(text) if not isinstance(text, str) else text
+        if self.header:
+            text = '\n' + HEADER_RULE + '\n' + text + '\n' + HEADER_RULE + '\n'
+        out = sys.stdout if stream is None else stream
+        line = f'{self.prefix}{text}{self.suffix}{self.end}'
+
+        # Same flag check here: a wrapper would double the cost of a compiled write
+        if not profiling.is_enabled():
+            out.write(line)
+            return
+        with span('fancy_print.write'):
+            out.write(line)
+        return
+
+
+def _get_printer():
+    """Returns the shared printer, creating it on first use."""
+    global _printer
+
+    # One printer for the whole process, so its caches stay warm
+    if _printer is None:
+        _printer = FancyPrinter()
+    return _printer
+
+
+def set_stream(stream):
+    """Sends the output of ``fancy_print()`` to another stream or sink.
+
+    Useful with ``fun.printing.sinks.AsyncSink`` when many threads print at once, and as a pool
+    initializer with ``ProcessSink.client()`` for worker processes.
+
+    Arguments:
+        stream (file): Text stream or sink. Use None for sys.stdout.
+    """
+    _get_printer().stream = stream
+    return
+
+
+def compile_style(**kwargs):
+    """Validates formatting options once and returns a reusable ``Style``.
+
+    Use this in hot loops instead of calling ``fancy_print()`` with the same options many times.
+
+    Keyword Arguments:
+        Same as ``fancy_print()``, except `demo`.
+
+    Returns:
+        An immutable ``Style``.
+    """
+    return _get_printer().compile_style(**kwargs)
+
+
 def fancy_print(string=None, **kwargs):
     """Prints text to console using a variety of formatting methods.
 
@@ -367,8 +625,8 @@ def fancy_print(string=None, **kwargs):
     Returns:
         No returns.
     """
-    demo = kwargs.get('demo', False)
-    p = FancyPrinter()
+    demo = kwargs.pop('demo', False)
+    p = _get_printer()
 
     if demo:
         p.demo(string)
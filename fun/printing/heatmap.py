@@ -0,0 +1,334 @@
+"""Heatmaps and sparklines for numeric series, one string per row.
+
+Values are mapped to colors through a lookup table built once from the Fancy Printer's palette,
+e.g. the dark, medium, normal and light versions of a hue. Runs of cells with the same color share
+one escape code, and a whole row is a single string, so thousands of channels can be shown
+without a ``fancy_print()`` call per cell.
+
+Inputs can be lists, ``array`` objects, memoryviews (e.g. ``Data.column()``), or NumPy arrays.
+NumPy is used for the math when it is installed, but is never required.
+
+Colors follow the printer's color depth. Without colors, heatmaps fall back to shading characters.
+
+Try:    ``>>> Heatmap('heat').print([[0, 1, 2, 3], [3, 2, 1, 0]])``
+Try:    ``>>> print(sparkline([1, 5, 2, 8, 3], ramp='green'))``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import sys
+from itertools import groupby
+
+from fun.printing.formatted_console_print import RESET, _get_printer
+from fun.printing.terminal import sgr_color
+from fun.printing.text import pad, visible_len
+
+
+# Multi-hue ramps, from low to high, by color name
+RAMPS = {
+    'heat': ('dark_blue', 'blue', 'cyan', 'green', 'yellow', 'orange', 'red'),
+    'grey': ('black', 'dark_grey', 'medium_grey', 'light_grey', 'white'),
+    'traffic': ('green', 'yellow', 'orange', 'red'),
+}
+
+DEFAULT_LEVELS = 32
+
+# Heights for sparklines, and shades for heatmaps without color
+BARS = '▁▂▃▄▅▆▇█'
+SHADES = ' ░▒▓█'
+
+AGGREGATES = ('mean', 'max', 'min')
+
+
+def _numpy():
+    """Returns numpy if it is installed, else None."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def ramp_colors(ramp, printer=None):
+    """Returns the RGB stops of a ramp.
+
+    Arguments:
+        ramp (obj): A name in RAMPS; a hue such as 'green' (its dark, medium, normal and light
+            versions); or a sequence of color names, '#rrggbb' strings, or (R, G, B) tuples.
+        printer (FancyPrinter): Optional. Supplies the palette. Default is the shared printer.
+    """
+    printer = printer if printer is not None else _get_printer()
+    colors = printer.rgb_dict
+
+    if isinstance(ramp, str):
+        if ramp in RAMPS:
+            ramp = RAMPS[ramp]
+        elif f'dark_{ramp}' in colors:
+            ramp = (f'dark_{ramp}', f'medium_{ramp}', ramp, f'light_{ramp}')
+        else:
+            msg = f'\'{ramp}\' is not a ramp or hue. Ramps are: {list(RAMPS)}'
+            raise ValueError(msg)
+
+    stops = list()
+    for c in ramp:
+        if isinstance(c, str) and c in colors:
+            stops.append(colors[c])
+        elif isinstance(c, str) and len(c) == 7 and c[0] == '#':
+            stops.append(tuple(int(c[i:i + 2], 16) for i in (1, 3, 5)))
+        elif isinstance(c, (tuple, list)) and len(c) == 3:
+            stops.append(tuple(int(x) for x in c))
+        else:
+            msg = f'{c!r} is not a color. Use a color name, \'#rrggbb\', or an (R, G, B) tuple'
+            raise ValueError(msg)
+    if len(stops) < 2:
+        msg = 'A ramp needs at least two colors'
+        raise ValueError(msg)
+    return stops
+
+
+def interpolate(stops, levels):
+    """Returns `levels` RGB colors spread evenly along a ramp of stops."""
+    if levels == 1:
+        return [stops[-1]]
+    out = list()
+    for k in range(levels):
+        t = k / (levels - 1) * (len(stops) - 1)
+        i = min(int(t), len(stops) - 2)
+        f = t - i
+        a, b = stops[i], stops[i + 1]
+        out.append(tuple(round(a[j] + (b[j] - a[j]) * f) for j in range(3)))
+    return out
+
+
+def quantize(values, lo, hi, levels):
+    """Returns the level (0 to levels - 1) of each value; NaN and None become -1.
+
+    Arguments:
+        values (iterable): Numbers. NumPy arrays are handled in bulk.
+        lo (float): Value mapped to level 0. Lower values are clipped.
+        hi (float): Value mapped to the top level. Higher values are clipped.
+        levels (int): Number of levels.
+    """
+    scale = (levels - 1) / (hi - lo) if hi > lo else 0.0
+    top = levels - 1
+
+    np = _numpy()
+    if np is not None and isinstance(values, np.ndarray):
+        a = values.astype(float, copy=False)
+        missing = np.isnan(a)
+        idx = np.clip(np.where(missing, 0.0, (a - lo) * scale), 0, top).astype(np.intp)
+        idx[missing] = -1
+        return idx.tolist()
+
+    out = list()
+    append = out.append
+    for v in values:
+        if v is None or v != v:
+            append(-1)
+        elif v <= lo:
+            append(0)
+        elif v >= hi:
+            append(top)
+        else:
+            append(int((v - lo) * scale))
+    return out
+
+
+def _bounds(rows):
+    """Returns (min, max) over all finite values of some rows."""
+    np = _numpy()
+    lo = hi = None
+    for r in rows:
+        if np is not None and isinstance(r, np.ndarray):
+            if r.size == 0 or np.all(np.isnan(r)):
+                continue
+            rlo, rhi = float(np.nanmin(r)), float(np.nanmax(r))
+        else:
+            finite = [v for v in r if v is not None and v == v]
+            if len(finite) == 0:
+                continue
+            rlo, rhi = min(finite), max(finite)
+        lo = rlo if lo is None or rlo < lo else lo
+        hi = rhi if hi is None or rhi > hi else hi
+    return (0.0, 1.0) if lo is None else (lo, hi)
+
+
+def downsample(values, width, agg='mean'):
+    """Reduces a series to `width` points by aggregating equal buckets.
+
+    Arguments:
+        values (sequence): Numbers.
+        width (int): Number of points wanted.
+        agg (str): Optional. One of AGGREGATES. 'max' keeps spikes visible. Default is 'mean'.
+    """
+    if not isinstance(width, int) or width < 1:
+        msg = f'\'width\' must be a positive integer but you gave {width!r}'
+        raise ValueError(msg)
+    if agg not in AGGREGATES:
+        msg = f'\'{agg}\' is not a valid aggregate. Valid aggregates are: {list(AGGREGATES)}'
+        raise ValueError(msg)
+    n = len(values)
+    if width >= n:
+        return values
+
+    np = _numpy()
+    if np is not None:
+        a = np.asarray(values, dtype=float)
+        edges = (np.arange(width + 1) * n) // width
+        f = {'mean': np.add, 'max': np.maximum, 'min': np.minimum}[agg]
+        out = f.reduceat(a, edges[:-1])
+        if agg == 'mean':
+            out = out / np.diff(edges)
+        return out
+
+    f = {'mean': lambda b: sum(b) / len(b), 'max': max, 'min': min}[agg]
+    return [f(values[(i * n) // width:((i + 1) * n) // width]) for i in range(width)]
+
+
+class Heatmap(object):
+    """Renders rows of numbers as rows of colored cells.
+
+    Methods implemented:
+        - `row( )` : Returns one row as a string.
+        - `render( )` : Returns many rows, scaled together, as a list of strings.
+        - `print( )` : Prints many rows, with optional labels, in a single write.
+        - `legend( )` : Returns the ramp with its low and high values.
+
+    """
+
+    def __init__(self, ramp='heat', levels=DEFAULT_LEVELS, lo=None, hi=None, cell_width=2, printer=None):
+        """Builds the color lookup table.
+
+        Arguments:
+            ramp (obj): Optional. See ``ramp_colors()``. Default is 'heat'.
+            levels (int): Optional. Number of distinct colors. Default is DEFAULT_LEVELS.
+            lo (float): Optional. Value shown as the lowest color. Default is the lowest value rendered.
+            hi (float): Optional. Value shown as the highest color. Default is the highest value rendered.
+            cell_width (int): Optional. Characters per cell; 2 makes cells roughly square. Default is 2.
+            printer (FancyPrinter): Optional. Supplies palette, color depth and stream.
+                Default is the shared printer.
+        """
+        if not isinstance(levels, int) or levels < 1:
+            msg = f'\'levels\' must be a positive integer but you gave {levels!r}'
+            raise ValueError(msg)
+
+        self.printer = printer if printer is not None else _get_printer()
+        self.levels = levels
+        self.lo = lo
+        self.hi = hi
+        self.cell_width = cell_width
+        self.colors = interpolate(ramp_colors(ramp, self.printer), levels)
+
+        # Lookup table: level -> (escape, cell). Index -1 is for missing values.
+        depth = self.printer.color_depth
+        if depth == 'none':
+            lut = [('', SHADES[min(k * len(SHADES) // levels, len(SHADES) - 1)] * cell_width) for k in range(levels)]
+            lut.append(('', ' ' * cell_width))
+        else:
+            cell = ' ' * cell_width
+            lut = [(f'\x1b[{sgr_color(rgb, depth, background=True)}m', cell) for rgb in self.colors]
+            lut.append((RESET, cell))
+        # Same escape, same object, so runs coalesce even when a low color depth merges levels
+        seen = dict()
+        self._lut = [seen.setdefault(t, t) for t in lut]
+        self._plain = depth == 'none'
+        return
+
+    def __repr__(self):
+        return f'Heatmap with {self.levels} levels at color depth {self.printer.color_depth}'
+
+    def row(self, values, lo=None, hi=None):
+        """Returns one row of cells as a string.
+
+        Arguments:
+            values (iterable): Numbers.
+            lo, hi (float): Optional. Override the scale. Default is the heatmap's, or this row's range.
+        """
+        lo = lo if lo is not None else self.lo
+        hi = hi if hi is not None else self.hi
+        if lo is None or hi is None:
+            blo, bhi = _bounds([values])
+            lo = blo if lo is None else lo
+            hi = bhi if hi is None else hi
+        return self._row(quantize(values, lo, hi, self.levels))
+
+    def _row(self, idx):
+        lut = self._lut
+        out = list()
+        for (escape, cell), run in groupby(map(lut.__getitem__, idx)):
+            out.append(escape)
+            out.append(cell * sum(1 for _ in run))
+        if not self._plain:
+            out.append(RESET)
+        return ''.join(out)
+
+    def render(self, rows):
+        """Returns each row as a string. All rows share one scale unless lo and hi were given."""
+        rows = list(rows)
+        lo, hi = self.lo, self.hi
+        if lo is None or hi is None:
+            blo, bhi = _bounds(rows)
+            lo = blo if lo is None else lo
+            hi = bhi if hi is None else hi
+        return [self._row(quantize(r, lo, hi, self.levels)) for r in rows]
+
+    def print(self, rows, labels=None, stream=None):
+        """Prints rows, each optionally preceded by a label, in a single write.
+
+        Arguments:
+            rows (iterable): Rows of numbers.
+            labels (list): Optional. One label per row. Default is None.
+            stream (file): Optional. Text stream to write to. Default is the printer's stream.
+        """
+        lines = self.render(rows)
+        if labels is not None:
+            labels = [str(x) for x in labels]
+            width = max((visible_len(x) for x in labels), default=0)
+            lines = [f'{pad(x, width)} {line}' for x, line in zip(labels, lines)]
+        stream = stream if stream is not None else self.printer.stream
+        (sys.stdout if stream is None else stream).write('\n'.join(lines) + '\n')
+        return
+
+    def legend(self, lo, hi, width=None):
+        """Returns the full ramp between two labels, e.g. for printing under a heatmap."""
+        width = width if width is not None else self.levels
+        return f'{lo:g} {self._row(quantize([k / max(width - 1, 1) for k in range(width)], 0, 1, self.levels))} {hi:g}'
+
+
+def sparkline(values, width=None, ramp=None, lo=None, hi=None, agg='mean', printer=None):
+    """Returns a one-line chart of a series, using block characters of eight heights.
+
+    Arguments:
+        values (sequence): Numbers.
+        width (int): Optional. If the series is longer, it is downsampled to this many points.
+        ramp (obj): Optional. Colors the bars by height. See ``ramp_colors()``. Default is None.
+        lo, hi (float): Optional. Scale. Default is the range of the values.
+        agg (str): Optional. How points are combined when downsampling. Default is 'mean'.
+        printer (FancyPrinter): Optional. Supplies palette and color depth. Default is the shared printer.
+    """
+    if width is not None:
+        values = downsample(values, width, agg)
+    if lo is None or hi is None:
+        blo, bhi = _bounds([values])
+        lo = blo if lo is None else lo
+        hi = bhi if hi is None else hi
+
+    levels = len(BARS)
+    idx = quantize(values, lo, hi, levels)
+    printer = printer if printer is not None else _get_printer()
+
+    if ramp is None or printer.color_depth == 'none':
+        bars = BARS + ' '  # Index -1 (missing) is a space
+        return ''.join(map(bars.__getitem__, idx))
+
+    depth = printer.color_depth
+    escapes = [f'\x1b[{sgr_color(rgb, depth)}m' for rgb in interpolate(ramp_colors(ramp, printer), levels)]
+    out = list()
+    for level, run in groupby(idx):
+        n = sum(1 for _ in run)
+        out.append(RESET + ' ' * n if level < 0 else escapes[level] + BARS[level] * n)
+    out.append(RESET)
+    return ''.join(out)
@@ -0,0 +1,229 @@
+"""Inline markup for multi-colored lines, printed with a single write.
+
+Markup tags name styles from the Fancy Printer: colors, ``on <color>`` for the background,
+and the boolean flags. ``[/]`` closes the most recent tag. Tags can be nested.
+
+    ``'[warning]Sending to[/] [hlink]{addr}[/]'``
+    ``'[bold light_cerulean on dark_grey]Status:[/] [green]{}[/] of [red]{}[/]'``
+
+Everything outside tags is a ``str.format`` template, so ``{}`` fields are filled from the
+arguments. Values are inserted after parsing; markup inside them is printed as-is.
+Use ``[[`` and ``]]`` for literal brackets. A bracketed word that is not a style, e.g. ``[INFO]``,
+is printed as-is too.
+
+Parsed templates are cached, so a repeated template costs only ``str.format`` plus one write.
+
+Try:    ``>>> markup_print('[warning]Sending to[/] [hlink]{}[/]', 'joe@somewhere.com')``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import re
+import sys
+import weakref
+from functools import lru_cache
+
+from fun.printing.formatted_console_print import Style, _get_printer
+
+
+# Literal brackets, str.format fields (kept as they are), and tags
+_TOKEN = re.compile(r'\[\[|\]\]|\{\{|\}\}|\{[^{}]*\}|\[(/?)([^\[\]]*)\]')
+
+_FLAGS = frozenset(['bold', 'underscore', 'italic', 'strikethrough', 'framed', 'highlight'])
+
+# Renderers for printers, dropped with their printer; the shared printer's renderer is the common case
+_renderers = weakref.WeakKeyDictionary()
+
+
+class MarkupRenderer(object):
+    """Parses markup templates for one printer and caches the results.
+
+    Methods implemented:
+        - `compile( )` : Returns the ``str.format`` template with escape codes built in.
+        - `render( )` : Returns the styled string.
+        - `print( )` : Writes the styled string to the printer's stream.
+
+    """
+
+    def __init__(self, printer=None, cache_size=512):
+        """Initial setup.
+
+        Arguments:
+            printer (FancyPrinter): Optional. Supplies colors, color depth, and stream.
+                Default is the shared printer behind ``fancy_print()``.
+            cache_size (int): Optional. Number of parsed templates kept. Default is 512.
+        """
+        self.printer = printer if printer is not None else _get_printer()
+        self.compile = lru_cache(maxsize=cache_size)(self._compile)
+        return
+
+    def __repr__(self):
+        return f'Markup renderer with {self.compile.cache_info().currsize} cached templates'
+
+    def render(self, template, *args, **fields):
+        """Returns the styled string for a markup template.
+
+        Arguments:
+            template (str): Markup template. See module docstring.
+            args, fields: Values for the ``str.format`` fields in the template.
+        """
+        return self.compile(template).format(*args, **fields)
+
+    def print(self, template, *args, end='\n', **fields):
+        """Writes the styled string, plus `end`, to the printer's stream with a single write.
+
+        Arguments:
+            template (str): Markup template. See module docstring.
+            args, fields: Values for the ``str.format`` fields in the template.
+            end (str): Optional. Appended to the output. Default is a line break.
+        """
+        stream = self.printer.stream
+        (sys.stdout if stream is None else stream).write(self.compile(template).format(*args, **fields) + end)
+        return
+
+    def _compile(self, template):
+        """Parses a markup template. Called through the cache in ``self.compile``."""
+        out = list()
+        run = list()
+        stack = list()
+
+        def flush_run():
+            if len(run) == 0:
+                return
+            text = ''.join(run)
+            run.clear()
+            if len(stack) == 0:
+                out.append(text)
+                return
+            options = dict()
+            for opts in stack:
+                options.update(opts)
+            style = self.printer.compile_style(**options)
+            out.append(style.prefix + text + style.suffix)
+
+        pos = 0
+        for mo in _TOKEN.finditer(template):
+            run.append(template[pos:mo.start()])
+            pos = mo.end()
+            tok = mo.group(0)
+
+            if tok == '[[':
+                run.append('[')
+            elif tok == ']]':
+                run.append(']')
+            elif tok[0] == '{' or tok[0] == '}':
+                run.append(tok)
+            elif mo.group(1):
+                if len(stack) == 0:
+                    run.append(tok)  # Nothing to close; keep as text
+                    continue
+                flush_run()
+                stack.pop()
+            else:
+                opts = parse_style_words(mo.group(2), self.printer.rgb_dict)
+                if opts is None:
+                    run.append(tok)  # Not a style; keep as text
+                    continue
+                flush_run()
+                stack.append(opts)
+
+        run.append(template[pos:])
+        flush_run()
+        return ''.join(out)
+
+
+def parse_style_words(body, colors):
+    """Returns fancy_print options for style words such as 'bold red on dark_grey'.
+
+    Arguments:
+        body (str): Space-separated color names, '#rrggbb' colors, 'on <color>', and flags.
+        colors (dict): Valid color names, e.g. ``FancyPrinter.rgb_dict``.
+
+    Returns:
+        A dict of options, or None if any word is not a style.
+    """
+    words = body.split()
+    if len(words) == 0:
+        return None
+
+    options = dict()
+    i = 0
+    while i < len(words):
+        w = words[i]
+        if w in _FLAGS:
+            options[w] = True
+        elif w == 'on' and i + 1 < len(words) and _is_color(words[i + 1], colors):
+            options['bg'] = words[i + 1]
+            i += 1
+        elif _is_color(w, colors):
+            options['fg'] = w
+        else:
+            return None
+        i += 1
+    return options
+
+
+def style_from_spec(spec, printer):
+    """Returns a ``Style`` from any of the ways styles are written in config and code.
+
+    Arguments:
+        spec (obj): A ``Style``, a dict of fancy_print options, or style words such as
+            'bold red on dark_grey'.
+        printer (FancyPrinter): Compiles the style.
+    """
+    if isinstance(spec, Style):
+        return spec
+    if isinstance(spec, dict):
+        return printer.compile_style(**spec)
+    if isinstance(spec, str):
+        options = parse_style_words(spec, printer.rgb_dict)
+        if options is None:
+            msg = f'\'{spec}\' is not a valid style. Use colors, \'on <color>\', and flags like \'bold\''
+            raise ValueError(msg)
+        return printer.compile_style(**options)
+    msg = f'A style must be a Style, dict, or string but you gave type {type(spec)}'
+    raise TypeError(msg)
+
+
+def _is_color(word, colors):
+    if word in colors:
+        return True
+    return len(word) == 7 and word[0] == '#' and all(c in '0123456789abcdefABCDEF' for c in word[1:])
+
+
+def get_renderer(printer=None):
+    """Returns the cached renderer for a printer. Default is the shared printer.
+
+    The renderer refers to its printer weakly, so keep the printer while using the renderer.
+    """
+    printer = printer if printer is not None else _get_printer()
+    renderer = _renderers.get(printer)
+    if renderer is None:
+        renderer = _renderers[printer] = MarkupRenderer(printer)
+        renderer.printer = weakref.proxy(printer)  # A strong reference would keep the entry forever
+    return renderer
+
+
+def render(template, *args, **fields):
+    """Returns the styled string for a markup template, using the shared printer.
+
+    See the module docstring for the markup syntax.
+    """
+    return get_renderer().render(template, *args, **fields)
+
+
+def markup_print(template, *args, end='\n', **fields):
+    """Prints a markup template with a single write, using the shared printer.
+
+    See the module docstring for the markup syntax.
+
+    Arguments:
+        template (str): Markup template.
+        args, fields: Values for the ``str.format`` fields in the template.
+        end (str): Optional. Appended to the output. Default is a line break.
+    """
+    get_renderer().print(template, *args, end=end, **fields)
+    return
@@ -0,0 +1,210 @@
+"""Live progress line for long jobs, redrawn at a limited rate.
+
+Counting is cheap and safe from many threads at once: each thread adds to its own counters,
+and they are only summed when the line is redrawn. Redraws happen at most `refresh` seconds
+apart, so a job doing a million small steps draws about as often as one doing a hundred.
+
+On a terminal the line is redrawn in place. Anywhere else (log files, CI, pipes) a plain line
+is written every `plain_interval` seconds instead, so logs stay readable.
+
+Try:    ``>>> with Progress(total=1000, label='Sending') as p: ... p.advance()``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import sys
+import time
+import threading
+
+from fun.printing.formatted_console_print import _get_printer
+
+
+DEFAULT_REFRESH = 0.1
+DEFAULT_PLAIN_INTERVAL = 5.0
+DEFAULT_BAR_WIDTH = 24
+
+ERASE_LINE = '\x1b[K'
+
+
+class Progress(object):
+    """A progress line for a job with a known or unknown number of steps.
+
+    Methods implemented:
+        - `advance( )` : Counts finished steps.
+        - `count( )` : Counts something else, e.g. failures, shown as ``name=N``.
+        - `set_status( )` : Sets a short status text shown at the end of the line.
+        - `refresh( )` : Redraws now if a redraw is due (or always, with force=True).
+        - `close( )` : Draws the final state and ends the line.
+
+    """
+
+    def __init__(self, total=None, label='', stream=None, refresh=DEFAULT_REFRESH,
+                 plain_interval=DEFAULT_PLAIN_INTERVAL, bar_width=DEFAULT_BAR_WIDTH, live=None, printer=None):
+        """Initial setup.
+
+        Arguments:
+            total (int): Optional. Number of steps, if known. Shows a bar, percent, and time left.
+            label (str): Optional. Text at the start of the line. Default is ''.
+            stream (file): Optional. Text stream to draw on. Default is the printer's stream.
+            refresh (float): Optional. Shortest time, in seconds, between redraws on a terminal.
+                Default is DEFAULT_REFRESH.
+            plain_interval (float): Optional. Seconds between plain lines when not on a terminal.
+                Default is DEFAULT_PLAIN_INTERVAL.
+            bar_width (int): Optional. Characters in the bar. Default is DEFAULT_BAR_WIDTH.
+            live (bool): Optional. Redraw in place. Default is True if the stream is a terminal.
+            printer (FancyPrinter): Optional. Styles the bar. Default is the shared printer.
+        """
+        self.printer = printer if printer is not None else _get_printer()
+        self.stream = stream if stream is not None else self.printer.stream
+        self.total = total
+        self.label = label
+        self.bar_width = bar_width
+        self.status = ''
+
+        if live is None:
+            out = sys.stdout if self.stream is None else self.stream
+            try:
+                live = bool(getattr(out, 'isatty', lambda: False)())
+            except ValueError:  # Closed stream
+                live = False
+        self.live = live
+        self.interval = refresh if live else plain_interval
+
+        self._bar_style = self.printer.compile_style(fg='light_cerulean')
+        self._started = time.monotonic()
+        self._next_draw = self._started + self.interval
+        self._cells = list()
+        self._local = threading.local()
+        self._register = threading.Lock()
+        self._drawing = threading.Lock()
+        self._closed = False
+        return
+
+    def __repr__(self):
+        total = f'/{self.total}' if self.total is not None else ''
+        return f'Progress {self.done}{total}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def done(self):
+        """Steps finished so far, from all threads."""
+        return sum(cell.get('', 0) for cell in list(self._cells))
+
+    def counters(self):
+        """Returns a dict of all counters from all threads, including '' for finished steps."""
+        totals = dict()
+        for cell in list(self._cells):
+            for k, v in list(cell.items()):
+                totals[k] = totals.get(k, 0) + v
+        return totals
+
+    def advance(self, n=1):
+        """Counts finished steps. Redraws if a redraw is due."""
+        cell = self._cell()
+        cell[''] = cell.get('', 0) + n
+        if time.monotonic() >= self._next_draw:
+            self._draw(False)
+        return
+
+    def count(self, name, n=1):
+        """Counts something other than finished steps, e.g. ``count('failed')``."""
+        cell = self._cell()
+        cell[name] = cell.get(name, 0) + n
+        return
+
+    def set_status(self, text):
+        """Sets a short status text shown at the end of the line."""
+        self.status = text
+        return
+
+    def refresh(self, force=False):
+        """Redraws if a redraw is due, or now if force is True."""
+        if force or time.monotonic() >= self._next_draw:
+            self._draw(force)
+        return
+
+    def close(self):
+        """Draws the final state and ends the line. Safe to call more than once."""
+        if self._closed:
+            return
+        self._draw(True)
+        self._closed = True
+        if self.live:
+            self._write('\n')
+        return
+
+    def _cell(self):
+        """Returns this thread's counters; only this thread writes to them."""
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = dict()
+            with self._register:
+                self._cells.append(cell)
+            return cell
+
+    def _write(self, s):
+        out = sys.stdout if self.stream is None else self.stream
+        out.write(s)
+        if hasattr(out, 'flush'):
+            out.flush()
+
+    def _draw(self, force):
+        # One drawer at a time; other threads just keep counting
+        if not self._drawing.acquire(blocking=force):
+            return
+        try:
+            if self._closed:
+                return
+            now = time.monotonic()
+            self._next_draw = now + self.interval
+            text = self._render(now)
+            if self.live:
+                self._write('\r' + text + ERASE_LINE)
+            else:
+                self._write(text + '\n')
+        finally:
+            self._drawing.release()
+
+    def _render(self, now):
+        counters = self.counters()
+        done = counters.pop('', 0)
+        elapsed = max(now - self._started, 1e-9)
+        rate = done / elapsed
+
+        parts = list()
+        if self.label:
+            parts.append(self.label)
+        if self.total:
+            frac = min(done / self.total, 1.0)
+            if self.live:
+                filled = int(frac * self.bar_width)
+                bar = '#' * filled + '-' * (self.bar_width - filled)
+                parts.append('[' + self._bar_style.format(bar) + ']')
+            parts.append(f'{frac * 100:5.1f}% {done}/{self.total}')
+        else:
+            parts.append(f'{done}')
+        parts.append(f'{rate:.1f}/s')
+        if self.total and 0 < rate and done < self.total:
+            parts.append('ETA ' + _clock((self.total - done) / rate))
+        else:
+            parts.append(_clock(elapsed))
+        for k in sorted(counters):
+            parts.append(f'{k}={counters[k]}')
+        if self.status:
+            parts.append(self.status)
+        return ' '.join(parts)
+
+
+def _clock(seconds):
+    """Returns seconds as H:MM:SS."""
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
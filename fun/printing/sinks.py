@@ -0,0 +1,410 @@
+"""Output sinks for the Fancy Printer.
+
+A sink looks like a text stream (it has `write( )` and `flush( )`), so it can be given to
+``FancyPrinter(stream=...)`` or ``Style.write(text, stream)``.
+
+Try:    ``>>> with FancyPrinter(stream=open('run.log', 'w'), flush_policy='size') as p: ...``
+
+For many threads printing at once, hand rendered lines to a single writer thread:
+
+Try:    ``>>> set_stream(AsyncSink())``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import sys
+import time
+import atexit
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+
+FLUSH_POLICIES = ('line', 'size', 'interval', 'explicit')
+DEFAULT_BUFFER_SIZE = 65536
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+FULL_POLICIES = ('block', 'drop_newest', 'drop_oldest')
+DEFAULT_MAX_LINES = 10000
+DEFAULT_LATENCY = 0.02
+
+# Sinks still alive at exit get flushed
+_live_sinks = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_live_sinks():
+    for sink in list(_live_sinks):
+        try:
+            sink.flush()
+        except Exception as e:
+            sys.stderr.write(f'fun.printing.sinks: Could not flush {sink!r} at exit: {e}\n')
+
+
+def _isatty(stream):
+    stream = sys.stdout if stream is None else stream
+    isatty = getattr(stream, 'isatty', None)
+    return isatty is not None and isatty()
+
+
+class BufferedSink(object):
+    """Collects writes in memory and passes them to a stream in large chunks.
+
+    **Flush policies:**
+        * 'line': Flush whenever a write contains a line break.
+        * 'size': Flush when `buffer_size` characters are waiting.
+        * 'interval': Flush on the first write after `flush_interval` seconds, or when `buffer_size`
+          characters are waiting. There is no timer; call `flush( )` to push out a quiet tail.
+        * 'explicit': Flush only when `flush( )` or `close( )` is called, or at exit.
+
+    Methods implemented:
+        - `write( )` : Adds text to the buffer.
+        - `flush( )` : Writes the buffer to the stream in one call.
+        - `batch( )` : Context manager that holds all flushes until it exits.
+        - `close( )` : Flushes. The underlying stream is left open.
+
+    A sink that is garbage-collected flushes first. Still, close it (or use it in a ``with``
+    block) before closing its stream: at exit, a closed stream can no longer take the buffer.
+
+    """
+
+    def __init__(self, stream=None, flush_policy='line', buffer_size=DEFAULT_BUFFER_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """Initial setup.
+
+        Arguments:
+            stream (file): Optional. Text stream to write to. Default is sys.stdout at flush time.
+            flush_policy (str): Optional. One of FLUSH_POLICIES. Default is 'line'.
+            buffer_size (int): Optional. Characters held before a 'size' or 'interval' flush.
+                Default is DEFAULT_BUFFER_SIZE.
+            flush_interval (float): Optional. Seconds between 'interval' flushes.
+                Default is DEFAULT_FLUSH_INTERVAL.
+        """
+        if flush_policy not in FLUSH_POLICIES:
+            msg = f'\'{flush_policy}\' is not a valid flush policy. Valid policies are: {list(FLUSH_POLICIES)}'
+            raise ValueError(msg)
+
+        self.stream = stream
+        self.flush_policy = flush_policy
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+
+        self._buffer = list()
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+        _live_sinks.add(self)
+        return
+
+    def __repr__(self):
+        return f'Buffered sink ({self.flush_policy}) holding {self._size} characters'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self._flush()
+        except Exception:
+            pass
+
+    def isatty(self):
+        """Asks the underlying stream, so color detection sees through the sink."""
+        return _isatty(self.stream)
+
+    def write(self, s):
+        """Adds text to the buffer, flushing if the policy says so.
+
+        Returns:
+            Number of characters written, like a text stream.
+        """
+        with self._lock:
+            self._buffer.append(s)
+            self._size += len(s)
+            if self._batch_depth == 0 and self._due(s):
+                self._flush()
+        return len(s)
+
+    def flush(self):
+        """Writes the buffer to the stream in one call."""
+        with self._lock:
+            self._flush()
+        return
+
+    def close(self):
+        """Flushes. The underlying stream is left open."""
+        self.flush()
+        _live_sinks.discard(self)
+        return
+
+    @contextmanager
+    def batch(self):
+        """Holds all flushes until the block exits, then writes everything at once."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._flush()
+
+    def _due(self, s):
+        policy = self.flush_policy
+        if policy == 'line':
+            return '\n' in s
+        if policy == 'size':
+            return self._size >= self.buffer_size
+        if policy == 'interval':
+            return self._size >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_interval
+        return False
+
+    def _flush(self):
+        if self._size == 0 and len(self._buffer) == 0:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = [data]  # Kept if the write fails, e.g. because the stream was closed
+        self._last_flush = time.monotonic()
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write(data)
+        self._buffer = list()
+        self._size = 0
+        if hasattr(stream, 'flush'):
+            stream.flush()
+
+
+class AsyncSink(object):
+    """Hands writes to a single writer thread, which coalesces them into large writes.
+
+    Each `write( )` is queued whole, so lines printed by different threads never interleave.
+    Callers only append to a deque; they take a lock only when the queue is full and the
+    policy is 'block'.
+
+    **Policies when `max_lines` writes are waiting:**
+        * 'block': Callers wait for the writer to catch up (backpressure).
+        * 'drop_newest': The new write is dropped and counted in `dropped`.
+        * 'drop_oldest': The oldest waiting write is dropped and counted in `dropped`.
+
+    Methods implemented:
+        - `write( )` : Queues text for the writer thread.
+        - `flush( )` : Waits until everything queued has been written.
+        - `close( )` : Flushes and stops the writer thread. The underlying stream is left open.
+
+    """
+
+    def __init__(self, stream=None, max_lines=DEFAULT_MAX_LINES, full_policy='block',
+                 latency=DEFAULT_LATENCY, max_write=DEFAULT_BUFFER_SIZE):
+        """Initial setup. Starts the writer thread.
+
+        Arguments:
+            stream (file): Optional. Text stream to write to. Default is sys.stdout at write time.
+            max_lines (int): Optional. Writes that may wait in the queue. Default is DEFAULT_MAX_LINES.
+            full_policy (str): Optional. One of FULL_POLICIES. Default is 'block'.
+            latency (float): Optional. Longest time, in seconds, a write waits before the writer wakes.
+                Default is DEFAULT_LATENCY.
+            max_write (int): Optional. Characters per write to the stream. Default is DEFAULT_BUFFER_SIZE.
+        """
+        if full_policy not in FULL_POLICIES:
+            msg = f'\'{full_policy}\' is not a valid policy. Valid policies are: {list(FULL_POLICIES)}'
+            raise ValueError(msg)
+
+        self.stream = stream
+        self.max_lines = max_lines
+        self.full_policy = full_policy
+        self.latency = latency
+        self.max_write = max_write
+        self.dropped = 0
+
+        self._queue = deque(maxlen=max_lines if full_policy == 'drop_oldest' else None)
+        self._kick = threading.Event()
+        self._space = threading.Condition()
+        self._flushed = threading.Condition()
+        self._writing = False
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='fun-async-sink', daemon=True)
+        self._thread.start()
+        _live_sinks.add(self)
+        return
+
+    def __repr__(self):
+        return f'Async sink ({self.full_policy}) with {len(self._queue)} waiting, {self.dropped} dropped'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def isatty(self):
+        """Asks the underlying stream, so color detection sees through the sink."""
+        return _isatty(self.stream)
+
+    def write(self, s):
+        """Queues text for the writer thread.
+
+        Returns:
+            Number of characters accepted, like a text stream.
+        """
+        q = self._queue
+        if self.full_policy == 'drop_oldest':
+            if len(q) >= self.max_lines:
+                self.dropped += 1  # The deque's maxlen evicts the oldest on append
+            q.append(s)
+            return len(s)
+        if len(q) >= self.max_lines:
+            if self.full_policy == 'drop_newest' or self._closing:
+                self.dropped += 1
+                return len(s)
+            self._kick.set()
+            with self._space:
+                while len(q) >= self.max_lines and self._thread.is_alive():
+                    self._space.wait(self.latency)
+        q.append(s)
+        return len(s)
+
+    def flush(self):
+        """Waits until everything queued has been written to the stream."""
+        if not self._thread.is_alive() or self._thread is threading.current_thread():
+            self._drain()
+            return
+        with self._flushed:
+            while (len(self._queue) > 0 or self._writing) and self._thread.is_alive():
+                self._kick.set()
+                self._flushed.wait(self.latency)
+        if not self._thread.is_alive():
+            # The writer died, e.g. on a write error; write what is left here, raising that error
+            self._drain()
+        return
+
+    def close(self):
+        """Flushes and stops the writer thread. The underlying stream is left open."""
+        self._closing = True
+        self._kick.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._drain()
+        _live_sinks.discard(self)
+        return
+
+    def _run(self):
+        while True:
+            self._kick.wait(self.latency)
+            self._kick.clear()
+            self._drain()
+            if self._closing and len(self._queue) == 0:
+                return
+
+    def _drain(self):
+        q = self._queue
+        stream = sys.stdout if self.stream is None else self.stream
+        wrote = False
+        while len(q) > 0:
+            self._writing = True
+            parts = list()
+            size = 0
+            try:
+                while size < self.max_write:
+                    s = q.popleft()
+                    parts.append(s)
+                    size += len(s)
+            except IndexError:
+                pass
+            try:
+                stream.write(''.join(parts))
+            finally:
+                self._writing = False
+            wrote = True
+            if self.full_policy == 'block':
+                with self._space:
+                    self._space.notify_all()
+        if wrote and hasattr(stream, 'flush'):
+            stream.flush()
+        with self._flushed:
+            self._flushed.notify_all()
+
+
+class ProcessSink(AsyncSink):
+    """An ``AsyncSink`` that also collects lines from worker processes.
+
+    Workers write to a picklable ``QueueWriter`` from `client( )`, which forwards each write over
+    a multiprocessing queue to this process. For pools, install it in every worker:
+
+    Try:    ``>>> Pool(initializer=set_stream, initargs=(sink.client(),))``
+
+    Methods implemented:
+        - `client( )` : Returns a ``QueueWriter`` for worker processes.
+        - `close( )` : Collects what workers sent, flushes, and stops both threads.
+
+    """
+
+    def __init__(self, stream=None, max_lines=DEFAULT_MAX_LINES, full_policy='block',
+                 latency=DEFAULT_LATENCY, max_write=DEFAULT_BUFFER_SIZE, context=None):
+        """Initial setup. Starts the writer thread and the thread that collects from workers.
+
+        Arguments:
+            context (obj): Optional. A multiprocessing context, e.g. from ``get_context('spawn')``.
+                Default is the multiprocessing module itself.
+
+        See ``AsyncSink`` for the other arguments. `max_lines` also bounds the multiprocessing queue.
+        """
+        import multiprocessing
+
+        super().__init__(stream, max_lines=max_lines, full_policy=full_policy, latency=latency,
+                         max_write=max_write)
+        ctx = multiprocessing if context is None else context
+        self.mp_queue = ctx.Queue(maxsize=max_lines)
+        self._collector = threading.Thread(target=self._collect, name='fun-process-sink', daemon=True)
+        self._collector.start()
+        return
+
+    def client(self):
+        """Returns a picklable writer for worker processes."""
+        return QueueWriter(self.mp_queue, self.full_policy)
+
+    def close(self):
+        """Collects what workers sent, flushes, and stops both threads."""
+        self.mp_queue.put(None)
+        self._collector.join()
+        super().close()
+        return
+
+    def _collect(self):
+        while True:
+            s = self.mp_queue.get()
+            if s is None:
+                return
+            self.write(s)
+
+
+class QueueWriter(object):
+    """Stream-like writer for worker processes; forwards each write to a ``ProcessSink``."""
+
+    def __init__(self, mp_queue, full_policy='block'):
+        self.mp_queue = mp_queue
+        self.full_policy = full_policy
+        self.dropped = 0
+
+    def __repr__(self):
+        return f'Queue writer ({self.full_policy}), {self.dropped} dropped'
+
+    def write(self, s):
+        if self.full_policy == 'block':
+            self.mp_queue.put(s)
+        else:
+            try:
+                self.mp_queue.put_nowait(s)
+            except Exception:
+                self.dropped += 1
+        return len(s)
+
+    def flush(self):
+        pass
@@ -0,0 +1,261 @@
+"""Aligned, styled tables, streamed row by row.
+
+Column widths are measured on a bounded window of leading rows, so a table of any length is
+printed at constant memory: the window is printed once widths are known, then the remaining
+rows are rendered as they arrive. Widths count only what is shown, so styled cells line up.
+
+Rows can be sequences or dicts, and can come from any iterable, e.g. a generator over a file
+or a database cursor.
+
+Try:    ``>>> print_table([('alice', 3, 'ok'), ('bob', 12, 'failed')], columns=['user', 'sent', 'status'],``
+        ``...             styles={'status': 'warning'})``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import sys
+from itertools import islice
+
+from fun.printing.formatted_console_print import _get_printer
+from fun.printing.markup import style_from_spec
+from fun.printing.text import ALIGNMENTS, pad, truncate, visible_len
+
+
+DEFAULT_SAMPLE_SIZE = 1000
+DEFAULT_MAX_WIDTH = 40
+
+# Rendered lines joined into one write
+DEFAULT_CHUNK_ROWS = 256
+
+OVERFLOWS = ('truncate', 'extend')
+
+
+class Table(object):
+    """Renders rows as aligned columns. One table can render many row sets.
+
+    Methods implemented:
+        - `lines( )` : Yields rendered lines, lazily.
+        - `print( )` : Writes the rendered table to a stream, a chunk of lines at a time.
+
+    """
+
+    def __init__(self, columns=None, styles=None, align=None, header_style='bold', sample_size=DEFAULT_SAMPLE_SIZE,
+                 max_width=DEFAULT_MAX_WIDTH, overflow='truncate', separator='  ', rule='-', printer=None):
+        """Initial setup.
+
+        Arguments:
+            columns (list): Optional. Column names. Default is the keys of the first row for dict rows,
+                or no header for sequence rows.
+            styles (obj): Optional. Cell styles, as a list in column order or a dict keyed by column
+                name. A style is a ``Style``, a dict of fancy_print options, or style words such as
+                'bold red'. Default is None.
+            align (obj): Optional. 'left', 'right' or 'center', as a list or dict like `styles`. Default is
+                'right' for columns of numbers and 'left' otherwise.
+            header_style (obj): Optional. Style of the header row. Default is 'bold'.
+            sample_size (int): Optional. Rows measured to choose column widths. Default is DEFAULT_SAMPLE_SIZE.
+            max_width (int): Optional. Widest a column gets from measuring. Default is DEFAULT_MAX_WIDTH.
+            overflow (str): Optional. 'truncate' cuts cells wider than their column, with an ellipsis;
+                'extend' prints them whole. Columns of numbers are never cut. Default is 'truncate'.
+            separator (str): Optional. Text between columns. Default is two spaces.
+            rule (str): Optional. Character for the line under the header, or '' for none. Default is '-'.
+            printer (FancyPrinter): Optional. Compiles styles and supplies the stream.
+                Default is the shared printer behind ``fancy_print()``.
+        """
+        if overflow not in OVERFLOWS:
+            msg = f'\'{overflow}\' is not a valid overflow. Valid choices are: {list(OVERFLOWS)}'
+            raise ValueError(msg)
+
+        self.printer = printer if printer is not None else _get_printer()
+        self.columns = list(columns) if columns is not None else None
+        self.styles = styles
+        self.align = align
+        self.header_style = style_from_spec(header_style, self.printer) if header_style else None
+        self.sample_size = max(int(sample_size), 1)
+        self.max_width = max_width
+        self.overflow = overflow
+        self.separator = separator
+        self.rule = rule
+        return
+
+    def __repr__(self):
+        columns = len(self.columns) if self.columns is not None else 'auto'
+        return f'Table with {columns} columns, widths from {self.sample_size} rows'
+
+    def lines(self, rows):
+        """Yields the rendered lines of a table: header, rule, then one line per row.
+
+        Arguments:
+            rows (iterable): Sequences or dicts. Only `sample_size` rows are held at a time.
+        """
+        it = iter(rows)
+        sample = list(islice(it, self.sample_size))
+        if len(sample) == 0 and self.columns is None:
+            return
+
+        columns = self.columns
+        if columns is None and len(sample) > 0 and isinstance(sample[0], dict):
+            columns = list(sample[0].keys())
+        to_cells = self._cell_getter(columns)
+
+        sample = [to_cells(r) for r in sample]
+        count = len(columns) if columns is not None else max(len(c) for c in sample)
+        widths = self._measure(columns, sample, count)
+        layout = self._layout(columns, sample, count, widths)
+
+        if columns is not None:
+            header = [str(c) for c in columns]
+            if self.header_style is not None:
+                hs = self.header_style
+                yield self._render(header, [(w, a, c, hs.prefix, hs.suffix) for w, a, c, _, _ in layout])
+            else:
+                yield self._render(header, layout)
+            if self.rule:
+                yield self.separator.join(self.rule * w for w in widths)
+
+        for cells in sample:
+            yield self._render(cells, layout)
+        del sample
+
+        render = self._render
+        for row in it:
+            yield render(to_cells(row), layout)
+
+    def print(self, rows, stream=None):
+        """Writes the rendered table, a chunk of lines per write.
+
+        Arguments:
+            rows (iterable): Sequences or dicts.
+            stream (file): Optional. Text stream to write to. Default is the printer's stream.
+
+        Returns:
+            Number of lines written.
+        """
+        stream = stream if stream is not None else self.printer.stream
+        write = (sys.stdout if stream is None else stream).write
+
+        count = 0
+        chunk = list()
+        for line in self.lines(rows):
+            chunk.append(line)
+            if len(chunk) >= DEFAULT_CHUNK_ROWS:
+                write('\n'.join(chunk) + '\n')
+                count += len(chunk)
+                chunk.clear()
+        if len(chunk) > 0:
+            write('\n'.join(chunk) + '\n')
+            count += len(chunk)
+        return count
+
+    @staticmethod
+    def _cell_getter(columns):
+        """Returns a function turning a row into a list of cell strings."""
+        def text(v):
+            if v is None:
+                return ''
+            return v if isinstance(v, str) else str(v)
+
+        if columns is None:
+            return lambda row: [text(v) for v in row]
+
+        def cells(row):
+            if isinstance(row, dict):
+                return [text(row.get(c)) for c in columns]
+            return [text(v) for v in row]
+        return cells
+
+    def _measure(self, columns, sample, count):
+        widths = [0] * count
+        if columns is not None:
+            for i, c in enumerate(columns):
+                widths[i] = visible_len(str(c))
+        for cells in sample:
+            for i, text in enumerate(cells[:count]):
+                n = visible_len(text)
+                if n > widths[i]:
+                    widths[i] = n
+        if self.max_width is not None:
+            widths = [min(w, max(self.max_width, 1)) for w in widths]
+        return widths
+
+    def _per_column(self, spec, columns, count):
+        """Expands a list or dict of per-column settings into a list in column order."""
+        if spec is None:
+            return [None] * count
+        if isinstance(spec, dict):
+            names = columns if columns is not None else range(count)
+            return [spec.get(c) for c in names]
+        values = list(spec)[:count]
+        return values + [None] * (count - len(values))
+
+    def _layout(self, columns, sample, count, widths):
+        """Returns (width, alignment, cut, prefix, suffix) for each column."""
+        styles = self._per_column(self.styles, columns, count)
+        aligns = self._per_column(self.align, columns, count)
+
+        layout = list()
+        for i in range(count):
+            a = aligns[i]
+            numeric = self._numeric(sample, i)
+            if a is None:
+                a = 'right' if numeric else 'left'
+            elif a not in ALIGNMENTS:
+                msg = f'\'{a}\' is not a valid alignment. Valid alignments are: {list(ALIGNMENTS)}'
+                raise ValueError(msg)
+
+            prefix = suffix = ''
+            if styles[i] is not None:
+                s = style_from_spec(styles[i], self.printer)
+                prefix, suffix = s.prefix, s.suffix
+            # Cutting digits off a number would misreport it, so only text is truncated
+            cut = self.overflow == 'truncate' and not numeric
+            layout.append((widths[i], a, cut, prefix, suffix))
+        return layout
+
+    @staticmethod
+    def _numeric(sample, i):
+        seen = False
+        for cells in sample:
+            if i >= len(cells) or cells[i] == '':
+                continue
+            try:
+                float(cells[i])
+            except ValueError:
+                return False
+            seen = True
+        return seen
+
+    def _render(self, cells, layout):
+        parts = list()
+        last = len(layout) - 1
+        for i, (width, align, cut, prefix, suffix) in enumerate(layout):
+            text = cells[i] if i < len(cells) else ''
+            if cut:
+                text = truncate(text, width)
+            gap = width - visible_len(text)
+            if prefix and text:
+                text = prefix + text + suffix
+            if gap <= 0 or (i == last and align == 'left'):
+                parts.append(text)  # No trailing spaces
+            else:
+                # Width was measured before styling, so styles don't cost a second measurement
+                parts.append(pad(text, width, align, visible=width - gap))
+        return self.separator.join(parts).rstrip(' ')
+
+
+def print_table(rows, columns=None, **kwargs):
+    """Prints rows as an aligned table, using the shared printer. Streams at constant memory.
+
+    Arguments:
+        rows (iterable): Sequences or dicts.
+        columns (list): Optional. Column names. Default is the keys of the first row for dict rows.
+
+    Keyword Arguments:
+        Passed to ``Table()``.
+
+    Returns:
+        Number of lines written.
+    """
+    return Table(columns=columns, **kwargs).print(rows)
@@ -0,0 +1,140 @@
+"""Terminal color support: detection and nearest-color downsampling.
+
+The Fancy Printer thinks in 24-bit RGB. Many consoles don't: serial consoles and CI log viewers
+may only know 256 or 16 colors, and files want no escape codes at all. This module detects what
+a stream can show and converts RGB colors to the best SGR code for it.
+
+Color depths, from most to least capable:
+    * 'truecolor': 24-bit ``38;2;R;G;B``
+    * '256': xterm 256-color palette ``38;5;N``
+    * '16': classic ANSI colors ``30``-``37`` and ``90``-``97``
+    * 'none': plain text, no escape codes
+
+Detection can be overridden with the environment variable ``FUN_COLOR`` set to one of the depths.
+``NO_COLOR`` (any value) selects 'none'.
+
+Try:    ``>>> sgr_color((255, 127, 0), '256')``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import os
+import sys
+from functools import lru_cache
+
+
+COLOR_DEPTHS = ('truecolor', '256', '16', 'none')
+
+# Levels of the 6x6x6 color cube in the xterm 256-color palette (indices 16-231)
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+# Levels of the grey ramp in the xterm 256-color palette (indices 232-255)
+GREY_LEVELS = tuple(8 + 10 * i for i in range(24))
+
+# Typical RGB values of the 16 ANSI colors; index i maps to SGR 30+i (i < 8) or 90+i-8
+ANSI_16 = (
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+    (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+)
+
+
+def _nearest_table(levels):
+    """Returns a 256-entry table mapping a channel value to the index of the nearest level."""
+    return tuple(min(range(len(levels)), key=lambda i: abs(levels[i] - v)) for v in range(256))
+
+
+# Precomputed per-channel lookups, so converting a color is a few table reads
+_CUBE_INDEX = _nearest_table(CUBE_LEVELS)
+_GREY_INDEX = _nearest_table(GREY_LEVELS)
+
+
+def detect_color_depth(stream=None):
+    """Returns the color depth a stream can show: one of COLOR_DEPTHS.
+
+    Arguments:
+        stream (file): Optional. The stream to check. Default is sys.stdout.
+    """
+    forced = os.environ.get('FUN_COLOR', '').lower()
+    if forced in COLOR_DEPTHS:
+        return forced
+    if 'NO_COLOR' in os.environ:
+        return 'none'
+
+    # JetBrains consoles are not TTYs, but they show 24-bit color just fine
+    if 'PYCHARM_HOSTED' in os.environ:
+        return 'truecolor'
+
+    stream = sys.stdout if stream is None else stream
+    isatty = getattr(stream, 'isatty', None)
+    try:
+        if isatty is None or not isatty():
+            return 'none'
+    except ValueError:  # Closed stream
+        return 'none'
+
+    term = os.environ.get('TERM', '').lower()
+    if os.environ.get('COLORTERM', '').lower() in ('truecolor', '24bit'):
+        return 'truecolor'
+    if 'WT_SESSION' in os.environ:  # Windows Terminal
+        return 'truecolor'
+    if term == 'dumb':
+        return 'none'
+    if '256' in term:
+        return '256'
+    return '16'
+
+
+def rgb_to_256(rgb):
+    """Returns the index of the nearest color in the xterm 256-color palette."""
+    r, g, b = rgb
+
+    # Nearest color in the 6x6x6 cube
+    ri, gi, bi = _CUBE_INDEX[r], _CUBE_INDEX[g], _CUBE_INDEX[b]
+    cr, cg, cb = CUBE_LEVELS[ri], CUBE_LEVELS[gi], CUBE_LEVELS[bi]
+    cube_dist = (cr - r) ** 2 + (cg - g) ** 2 + (cb - b) ** 2
+
+    # Nearest grey on the ramp
+    gi_ = _GREY_INDEX[(r + g + b) // 3]
+    grey = GREY_LEVELS[gi_]
+    grey_dist = (grey - r) ** 2 + (grey - g) ** 2 + (grey - b) ** 2
+
+    if grey_dist < cube_dist:
+        return 232 + gi_
+    return 16 + 36 * ri + 6 * gi + bi
+
+
+def rgb_to_16(rgb):
+    """Returns the index (0-15) of the nearest ANSI color."""
+    r, g, b = rgb
+    return min(range(16), key=lambda i: (ANSI_16[i][0] - r) ** 2 + (ANSI_16[i][1] - g) ** 2 + (ANSI_16[i][2] - b) ** 2)
+
+
+@lru_cache(maxsize=1024)
+def sgr_color(rgb, depth, background=False):
+    """Returns the SGR parameters that select an RGB color at a color depth.
+
+    Arguments:
+        rgb (tuple): (R, G, B) integers from 0 to 255.
+        depth (str): One of COLOR_DEPTHS.
+        background (bool): Optional. If True, selects the background color. Default is False.
+
+    Returns:
+        A string such as '38;2;255;0;0', '38;5;196', '91', or '' for depth 'none'.
+    """
+    if depth == 'truecolor':
+        return f'{48 if background else 38};2;{rgb[0]};{rgb[1]};{rgb[2]}'
+    if depth == '256':
+        return f'{48 if background else 38};5;{rgb_to_256(rgb)}'
+    if depth == '16':
+        i = rgb_to_16(rgb)
+        base = (40 if background else 30) if i < 8 else (100 if background else 90)
+        return str(base + i % 8)
+    if depth == 'none':
+        return ''
+    msg = f'\'{depth}\' is not a valid color depth. Valid depths are: {list(COLOR_DEPTHS)}'
+    raise ValueError(msg)
@@ -0,0 +1,234 @@
+"""Helpers for text that contains escape codes.
+
+Styled strings carry escape sequences that take no room on screen, and East Asian and emoji
+characters take two columns, so ``len()``, ``str.ljust()`` and ``textwrap`` get their layout wrong.
+These helpers measure, cut, wrap and pad by what is actually shown, and keep styles intact.
+
+All of them share one precompiled tokenizer. Results for repeated strings are cached, and
+plain printable ASCII takes a fast path that skips the tokenizer entirely.
+
+Try:    ``>>> visible_len(compile_style(fg='error').format('Oops'))``
+Try:    ``>>> wrap(render('[bold]Very[/] long text ...'), 40)``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import re
+import unicodedata
+from functools import lru_cache
+
+
+# CSI sequences (including SGR), OSC sequences such as hyperlinks, and two-character escapes
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]')
+
+# Same pattern as a capturing group, so split() alternates text and escapes
+_TOKENS = re.compile(f'({ANSI_ESCAPE.pattern})')
+
+RESET = '\x1b[0m'
+ALIGNMENTS = ('left', 'right', 'center')
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+def _plain(s):
+    """True if every character is printable ASCII, so the width is just len()."""
+    return s.isascii() and s.isprintable()
+
+
+@lru_cache(maxsize=None)
+def char_width(c):
+    """Returns the number of columns a character takes: 0, 1, or 2."""
+    o = ord(c)
+    if o < 32 or 0x7f <= o < 0xa0:
+        return 0
+    if o < 0x300:
+        return 1
+    if unicodedata.combining(c) or unicodedata.category(c) in ('Mn', 'Me', 'Cf'):
+        return 0
+    if unicodedata.east_asian_width(c) in ('W', 'F'):
+        return 2
+    return 1
+
+
+def strip_ansi(s):
+    """Returns the string without escape sequences."""
+    if '\x1b' not in s:
+        return s
+    return _strip_ansi(s)
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def _strip_ansi(s):
+    return ANSI_ESCAPE.sub('', s)
+
+
+def visible_len(s):
+    """Returns the number of columns shown on screen: escapes count 0, wide characters 2."""
+    if _plain(s):
+        return len(s)
+    return _visible_len(s)
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def _visible_len(s):
+    text = ANSI_ESCAPE.sub('', s) if '\x1b' in s else s
+    if _plain(text):
+        return len(text)
+    return sum(map(char_width, text))
+
+
+def pad(s, width, align='left', fill=' ', visible=None):
+    """Pads a string to a visible width. Strings already as wide are returned unchanged.
+
+    Arguments:
+        s (str): Text, possibly styled.
+        width (int): Columns to fill.
+        align (str): Optional. One of ALIGNMENTS. Default is 'left'.
+        fill (str): Optional. A single-column character. Default is a space.
+        visible (int): Optional. Visible width of `s`, if already known. Default is None (measured).
+    """
+    gap = width - (visible_len(s) if visible is None else visible)
+    if gap <= 0:
+        return s
+    if align == 'left':
+        return s + fill * gap
+    if align == 'right':
+        return fill * gap + s
+    if align == 'center':
+        return fill * (gap // 2) + s + fill * (gap - gap // 2)
+    msg = f'\'{align}\' is not a valid alignment. Valid alignments are: {list(ALIGNMENTS)}'
+    raise ValueError(msg)
+
+
+def truncate(s, width, ellipsis='…'):
+    """Cuts a string to a visible width, keeping its styles.
+
+    Arguments:
+        s (str): Text, possibly styled.
+        width (int): Most columns the result may take, including the ellipsis.
+        ellipsis (str): Optional. Marks that text was cut. Default is '…'.
+
+    Returns:
+        The string itself if it fits. Otherwise the cut string, ending with the ellipsis and,
+        if it was styled, a reset.
+    """
+    if _plain(s):
+        if len(s) <= width:
+            return s
+        e = visible_len(ellipsis)
+        if e <= width:
+            return s[:width - e] + ellipsis
+    elif visible_len(s) <= width:
+        return s
+    return _truncate(s, width, ellipsis)
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def _truncate(s, width, ellipsis):
+    target = width - visible_len(ellipsis)
+    if target < 0:
+        ellipsis = ''
+        target = max(width, 0)
+
+    out = list()
+    used = 0
+    styled = False
+    for i, tok in enumerate(_TOKENS.split(s)):
+        if i % 2 == 1:
+            out.append(tok)
+            styled = styled or tok[-1] == 'm'
+            continue
+        if _plain(tok) and used + len(tok) <= target:
+            out.append(tok)
+            used += len(tok)
+            continue
+        for c in tok:
+            w = char_width(c)
+            if used + w > target:
+                out.append(ellipsis)
+                if styled:
+                    out.append(RESET)
+                return ''.join(out)
+            out.append(c)
+            used += w
+    out.append(ellipsis)
+    return ''.join(out)
+
+
+def wrap(s, width):
+    """Word-wraps a string to a visible width, keeping its styles.
+
+    Lines break at spaces where possible; words wider than `width` are split. Existing line
+    breaks are kept. A style that spans a break is closed at the end of the line and opened
+    again on the next, so each line can be printed on its own.
+
+    Arguments:
+        s (str): Text, possibly styled.
+        width (int): Most columns per line.
+
+    Returns:
+        A list of lines, without line breaks.
+    """
+    if width < 1:
+        msg = f'\'width\' must be at least 1 but you gave {width!r}'
+        raise ValueError(msg)
+    if _plain(s) and len(s) <= width:
+        return [s]
+    return list(_wrap(s, width))
+
+
+def _fold(active, pieces):
+    """Returns the SGR escapes still in effect after a run of (piece, width) items."""
+    for piece, w in pieces:
+        if w == 0 and piece[:1] == '\x1b' and piece[-1] == 'm':
+            active = () if piece in (RESET, '\x1b[m') else active + (piece,)
+    return active
+
+
+def _join(start, pieces, end):
+    line = ''.join(start) + ''.join(p for p, _ in pieces)
+    return line + RESET if end else line
+
+
+@lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def _wrap(s, width):
+    lines = list()
+    active = tuple()
+    for para in s.split('\n'):
+        start = active
+        items = list()
+        used = 0
+        last_space = -1
+
+        for i, tok in enumerate(_TOKENS.split(para)):
+            if i % 2 == 1:
+                items.append((tok, 0))
+                continue
+            for c in tok:
+                w = char_width(c)
+                if used + w > width and used > 0:
+                    if c == ' ':
+                        head, rest = items, list()
+                    elif last_space >= 0:
+                        head, rest = items[:last_space], items[last_space + 1:]
+                    else:
+                        head, rest = items, list()
+                    end = _fold(start, head)
+                    lines.append(_join(start, head, end))
+                    start = end
+                    items = rest
+                    used = sum(w_ for _, w_ in items)
+                    last_space = max((j for j, (p, _) in enumerate(items) if p == ' '), default=-1)
+                    if c == ' ':
+                        continue
+                items.append((c, w))
+                used += w
+                if c == ' ':
+                    last_space = len(items) - 1
+
+        active = _fold(start, items)
+        lines.append(_join(start, items, active))
+    return tuple(lines)
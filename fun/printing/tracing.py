@@ -0,0 +1,278 @@
+"""Call tracing for hot paths: arguments, wall time and outcome of each call, kept in a ring buffer.
+
+Decorate functions with ``@trace``. While tracing is off, a traced function costs one flag check
+per call. While it is on, every Nth call (per function) is recorded into a preallocated ring
+buffer, so memory use is fixed no matter how long the process runs.
+
+Tracing is turned on with ``enable()``, or for the whole process with the environment variable
+``FUN_TRACE=1``. Records keep references to the arguments, not copies.
+
+Try:    ``>>> @trace(sample=10)``
+        ``... def parse(line): ...``
+Try:    ``>>> enable(); run_job(); print_summary()``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import os
+import sys
+import time
+import functools
+from array import array
+from itertools import count
+
+
+DEFAULT_CAPACITY = 65536
+
+_enabled = os.environ.get('FUN_TRACE', '') not in ('', '0')
+
+
+class RingBuffer(object):
+    """Fixed-size store of call records. Once full, each new record replaces the oldest.
+
+    Each record takes one slot in parallel, preallocated columns; claiming a slot is a single
+    atomic step, so records from many threads never collide.
+
+    Methods implemented:
+        - `record( )` : Stores one call.
+        - `records( )` : Returns stored calls, oldest first.
+        - `clear( )` : Forgets every record.
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Allocates the buffer.
+
+        Arguments:
+            capacity (int): Optional. Number of calls kept. Default is DEFAULT_CAPACITY.
+        """
+        if not isinstance(capacity, int) or capacity < 1:
+            msg = f'\'capacity\' must be a positive integer but you gave {capacity!r}'
+            raise ValueError(msg)
+
+        self.capacity = capacity
+        self.names = [None] * capacity
+        self.args = [None] * capacity
+        self.kwargs = [None] * capacity
+        self.status = [None] * capacity
+        self.started = array('d', bytes(8 * capacity))
+        self.durations = array('d', bytes(8 * capacity))
+        self.written = 0
+        self._slots = count()
+        return
+
+    def __repr__(self):
+        return f'Ring buffer holding {min(self.written, self.capacity)} of {self.capacity} calls'
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def record(self, name, args, kwargs, status, started, duration):
+        """Stores one call. `started` is a ``time.perf_counter()`` value; `duration` is in seconds."""
+        n = next(self._slots)
+        i = n % self.capacity
+        self.names[i] = name
+        self.args[i] = args
+        self.kwargs[i] = kwargs
+        self.status[i] = status
+        self.started[i] = started
+        self.durations[i] = duration
+        if n >= self.written:
+            self.written = n + 1
+        return
+
+    def records(self, name=None):
+        """Returns stored calls as dicts, oldest first.
+
+        Arguments:
+            name (str): Optional. Only calls of the function with this name. Default is all.
+        """
+        written = self.written
+        cap = self.capacity
+        order = range(written) if written <= cap else range(written - cap, written)
+        out = list()
+        for n in order:
+            i = n % cap
+            if self.names[i] is None or (name is not None and self.names[i] != name):
+                continue
+            out.append(dict(name=self.names[i], args=self.args[i], kwargs=self.kwargs[i],
+                            status=self.status[i], started=self.started[i], duration=self.durations[i]))
+        return out
+
+    def clear(self):
+        """Forgets every record. The memory stays allocated."""
+        for column in (self.names, self.args, self.kwargs, self.status):
+            column[:] = [None] * self.capacity
+        self.written = 0
+        self._slots = count()
+        return
+
+
+_buffer = RingBuffer(DEFAULT_CAPACITY)
+
+# Sampling rates of traced functions, by name
+_sample_rates = dict()
+
+
+def enable(capacity=None):
+    """Turns tracing on.
+
+    Arguments:
+        capacity (int): Optional. If given, starts a new, empty buffer of this size.
+    """
+    global _enabled, _buffer
+    if capacity is not None and capacity != _buffer.capacity:
+        _buffer = RingBuffer(capacity)
+    _enabled = True
+    return
+
+
+def disable():
+    """Turns tracing off. Records are kept."""
+    global _enabled
+    _enabled = False
+    return
+
+
+def is_enabled():
+    """Returns True while tracing is on."""
+    return _enabled
+
+
+def clear():
+    """Forgets every record."""
+    _buffer.clear()
+    return
+
+
+def trace(func=None, *, sample=1, name=None):
+    """Decorator that records calls while tracing is on.
+
+    Works with or without arguments: ``@trace`` or ``@trace(sample=100)``.
+
+    Arguments:
+        func (callable): The function to trace.
+        sample (int): Optional. Record every Nth call of this function. Default is 1 (every call).
+        name (str): Optional. Name in records and summaries. Default is the qualified name.
+
+    Returns:
+        The wrapped function.
+    """
+    if not isinstance(sample, int) or sample < 1:
+        msg = f'\'sample\' must be a positive integer but you gave {sample!r}'
+        raise ValueError(msg)
+
+    def decorate(f):
+        label = name if name is not None else f'{f.__module__}.{f.__qualname__}'
+        _sample_rates[label] = sample
+        calls = count()
+        perf_counter = time.perf_counter
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _enabled or (sample > 1 and next(calls) % sample):
+                return f(*args, **kwargs)
+            t0 = perf_counter()
+            try:
+                result = f(*args, **kwargs)
+            except BaseException as e:
+                _buffer.record(label, args, kwargs, type(e).__name__, t0, perf_counter() - t0)
+                raise
+            _buffer.record(label, args, kwargs, 'ok', t0, perf_counter() - t0)
+            return result
+
+        wrapper.trace_name = label
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+def records(name=None):
+    """Returns recorded calls as dicts, oldest first. See ``RingBuffer.records()``."""
+    return _buffer.records(name)
+
+
+def _percentile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summary():
+    """Returns one dict per traced function that has records, slowest p99 first.
+
+    Keys: name, recorded, sample, estimated (calls, accounting for sampling), errors,
+    p50_ms, p99_ms, max_ms.
+    """
+    durations = dict()
+    errors = dict()
+    for r in _buffer.records():
+        durations.setdefault(r['name'], list()).append(r['duration'])
+        if r['status'] != 'ok':
+            errors[r['name']] = errors.get(r['name'], 0) + 1
+
+    out = list()
+    for name, d in durations.items():
+        d.sort()
+        sample = _sample_rates.get(name, 1)
+        out.append(dict(name=name, recorded=len(d), sample=sample, estimated=len(d) * sample,
+                        errors=errors.get(name, 0), p50_ms=_percentile(d, 0.50) * 1e3,
+                        p99_ms=_percentile(d, 0.99) * 1e3, max_ms=d[-1] * 1e3))
+    out.sort(key=lambda s: s['p99_ms'], reverse=True)
+    return out
+
+
+def print_summary(stream=None):
+    """Prints call counts and latencies of traced functions as a table.
+
+    Arguments:
+        stream (file): Optional. Text stream to write to. Default is the shared printer's stream.
+    """
+    from fun.printing.formatted_console_print import _get_printer, compile_style
+    from fun.printing.table import Table
+
+    stream = stream if stream is not None else _get_printer().stream
+    out = sys.stdout if stream is None else stream
+
+    rows = summary()
+    compile_style(fg='light_cerulean', header=True).write(
+        f'TRACE SUMMARY: {len(_buffer)} calls in buffer of {_buffer.capacity}', out)
+    if len(rows) == 0:
+        compile_style(fg='warning').write('No calls recorded. Is tracing enabled?', out)
+        return
+
+    columns = ['name', 'recorded', 'sample', 'estimated', 'errors', 'p50_ms', 'p99_ms', 'max_ms']
+    for r in rows:
+        for k in ('p50_ms', 'p99_ms', 'max_ms'):
+            r[k] = f'{r[k]:.3f}'
+    Table(columns=columns, styles={'name': 'bold', 'errors': 'error', 'p99_ms': 'warning'}).print(rows, out)
+    return
+
+
+def print_calls(last=20, name=None, stream=None):
+    """Prints the most recent recorded calls with their arguments, one line per argument.
+
+    Arguments:
+        last (int): Optional. Number of calls to show. Default is 20.
+        name (str): Optional. Only calls of the function with this name. Default is all.
+        stream (file): Optional. Text stream to write to. Default is the shared printer's stream.
+    """
+    from fun.printing.formatted_console_print import _get_printer, compile_style
+
+    title = compile_style(fg='light_cerulean', bold=True)
+    dim = compile_style(fg='medium_grey', end='')
+    ok = compile_style(fg='green')
+    failed = compile_style(fg='error')
+
+    out = list()
+    for r in records(name)[-last:]:
+        status = ok if r['status'] == 'ok' else failed
+        out.append(f'{title.format(r["name"])}  {status.format(r["status"])}  {r["duration"] * 1e3:.3f} ms\n')
+        for i, a in enumerate(r['args']):
+            out.append(f'{dim.format(f"    arg {i}:")} {a!r}\n')
+        for k, v in r['kwargs'].items():
+            out.append(f'{dim.format(f"    {k}:")} {v!r}\n')
+    stream = stream if stream is not None else _get_printer().stream
+    (sys.stdout if stream is None else stream).write(''.join(out))
+    return
@@ -0,0 +1,304 @@
+"""Profiling mode for the whole package: how much time is spent inside fun, and where.
+
+The hot paths of the package are wrapped in named spans: building escape codes and writing
+in ``fancy_print()``, loading configuration in ``Communicator()``, parsing recipients, building
+MIME messages, and talking to the SMTP server. While profiling is off, a span costs one flag
+check. While it is on, each span adds its wall time to the stack of spans it ran inside, per
+thread, so nothing is shared or locked on the hot path.
+
+Turn profiling on with ``enable()``, or for the whole process with the environment variable
+``FUN_PROFILE``. With ``FUN_PROFILE=1`` the results are written to ``fun-profile-<pid>.folded``
+and ``fun-profile-<pid>.txt`` in the working directory when the process exits; any other value
+(except ``0``) is used as the path prefix instead.
+
+The ``.folded`` file has one collapsed stack per line, e.g. ``send_msg;smtp.send 5120``, with self
+time in microseconds, as read by flamegraph.pl, speedscope and inferno. The ``.txt`` file is a
+summary per span, and the share of wall time spent inside fun.
+
+Try:    ``>>> enable(); run_job(); print_summary()``
+Try:    ``$ FUN_PROFILE=/tmp/job python job.py && flamegraph.pl /tmp/job.folded > job.svg``
+
+"""
+
+__author__ = "Christopher Couch"
+__license__ = "MIT"
+__version__ = "2020-11"
+
+import os
+import sys
+import time
+import atexit
+import functools
+import threading
+
+
+_setting = os.environ.get('FUN_PROFILE', '')
+_enabled = _setting not in ('', '0')
+
+# Path prefix of the files written at exit, or None
+_output = None
+
+_started = time.perf_counter()
+_exit_hook_registered = False
+
+# One (stack, stats) pair per thread that has entered a span. The stack holds frames
+# [key, start, child time]; stats maps a key (tuple of span names) to [calls, self, total, max].
+_local = threading.local()
+_states = list()
+
+
+def _state():
+    try:
+        return _local.state
+    except AttributeError:
+        state = _local.state = (list(), dict())
+        _states.append(state)
+        return state
+
+
+def _enter(name):
+    stack = _state()[0]
+    key = stack[-1][0] + (name,) if stack else (name,)
+    stack.append([key, time.perf_counter(), 0.0])
+    return
+
+
+def _exit():
+    stack, stats = _state()
+    key, start, child = stack.pop()
+    elapsed = time.perf_counter() - start
+    s = stats.get(key)
+    if s is None:
+        s = stats[key] = [0, 0.0, 0.0, 0.0]
+    s[0] += 1
+    s[1] += elapsed - child
+    s[2] += elapsed
+    if elapsed > s[3]:
+        s[3] = elapsed
+    if stack:
+        stack[-1][2] += elapsed
+    return
+
+
+def enable(output=None):
+    """Turns profiling on.
+
+    Arguments:
+        output (str): Optional. Path prefix for the ``.folded`` and ``.txt`` files, which are
+            then written when the process exits. Default is None (call ``write()`` yourself).
+    """
+    global _enabled, _output, _started
+    if not _enabled:
+        _started = time.perf_counter()
+    _enabled = True
+    if output is not None:
+        _output = str(output)
+        _register_exit_hook()
+    return
+
+
+def disable():
+    """Turns profiling off. Results are kept."""
+    global _enabled
+    _enabled = False
+    return
+
+
+def is_enabled():
+    """Returns True while profiling is on."""
+    return _enabled
+
+
+def reset():
+    """Forgets all results and restarts the wall clock."""
+    global _started
+    for _, stats in list(_states):
+        stats.clear()
+    _started = time.perf_counter()
+    return
+
+
+class span(object):
+    """Context manager that times a block as a named span while profiling is on.
+
+    Try:    ``>>> with span('load_rules'): ...``
+    """
+
+    __slots__ = ('name', 'entered')
+
+    def __init__(self, name):
+        self.name = name
+        self.entered = False
+
+    def __enter__(self):
+        if _enabled:
+            _enter(self.name)
+            self.entered = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.entered:
+            self.entered = False
+            _exit()
+
+
+def profiled(name=None):
+    """Decorator that times each call as a span while profiling is on.
+
+    Arguments:
+        name (str): Optional. Span name in stacks and summaries. Default is the qualified name.
+
+    Returns:
+        The decorator.
+    """
+    def decorate(f):
+        label = name if name is not None else f.__qualname__
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return f(*args, **kwargs)
+            _enter(label)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _exit()
+
+        wrapper.span_name = label
+        return wrapper
+
+    return decorate
+
+
+def _merged():
+    """Returns stats of all threads, merged by stack."""
+    merged = dict()
+    for _, stats in list(_states):
+        for key, (calls, self_s, total, longest) in list(stats.items()):
+            m = merged.get(key)
+            if m is None:
+                merged[key] = [calls, self_s, total, longest]
+            else:
+                m[0] += calls
+                m[1] += self_s
+                m[2] += total
+                m[3] = max(m[3], longest)
+    return merged
+
+
+def collapsed():
+    """Returns the collapsed stacks as lines of ``name;name;name <self time in microseconds>``."""
+    return [f'{";".join(key)} {round(s[1] * 1e6)}' for key, s in sorted(_merged().items())]
+
+
+def summary():
+    """Returns one dict per span name, most total time first.
+
+    Keys: name, calls, total_ms (including spans inside it), self_ms, mean_ms, max_ms.
+    """
+    by_name = dict()
+    for key, (calls, self_s, total, longest) in _merged().items():
+        name = key[-1]
+        recursive = name in key[:-1]  # Already counted in the total of the outer span
+        s = by_name.setdefault(name, [0, 0.0, 0.0, 0.0])
+        s[0] += calls
+        s[1] += self_s
+        s[2] += 0.0 if recursive else total
+        s[3] = max(s[3], longest)
+
+    out = list()
+    for name, (calls, self_s, total, longest) in by_name.items():
+        out.append(dict(name=name, calls=calls, total_ms=total * 1e3, self_ms=self_s * 1e3,
+                        mean_ms=total / calls * 1e3, max_ms=longest * 1e3))
+    out.sort(key=lambda s: s['total_ms'], reverse=True)
+    return out
+
+
+def time_inside():
+    """Returns (seconds inside fun, seconds of wall time since profiling started).
+
+    Time inside fun is summed over threads, so with several threads it can exceed wall time.
+    """
+    inside = sum(s[2] for key, s in _merged().items() if len(key) == 1)
+    return inside, time.perf_counter() - _started
+
+
+def _summary_lines():
+    inside, wall = time_inside()
+    share = inside / wall * 100 if wall > 0 else 0.0
+    lines = [f'Time inside fun: {inside:.3f} s of {wall:.3f} s wall time ({share:.1f}%)', '']
+    columns = ('name', 'calls', 'total_ms', 'self_ms', 'mean_ms', 'max_ms')
+    rows = [[str(r['calls']) if c == 'calls' else r[c] if c == 'name' else f'{r[c]:.3f}' for c in columns]
+            for r in summary()]
+    widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+    lines.append('  '.join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(columns, widths))))
+    for r in rows:
+        lines.append('  '.join(v.ljust(w) if i == 0 else v.rjust(w) for i, (v, w) in enumerate(zip(r, widths))))
+    return lines
+
+
+def write(prefix):
+    """Writes the collapsed stacks and the summary to files.
+
+    Arguments:
+        prefix (str): Path prefix. Writes ``<prefix>.folded`` and ``<prefix>.txt``.
+
+    Returns:
+        A tuple of the two paths.
+    """
+    folded, text = f'{prefix}.folded', f'{prefix}.txt'
+    with open(folded, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(collapsed()) + '\n')
+    with open(text, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(_summary_lines()) + '\n')
+    return folded, text
+
+
+def print_summary(stream=None):
+    """Prints the share of time inside fun, then a table of spans.
+
+    Arguments:
+        stream (file): Optional. Text stream to write to. Default is the shared printer's stream.
+    """
+    from fun.printing.formatted_console_print import _get_printer, compile_style
+    from fun.printing.table import Table
+
+    stream = stream if stream is not None else _get_printer().stream
+    out = sys.stdout if stream is None else stream
+
+    rows = summary()
+    inside, wall = time_inside()
+    share = inside / wall * 100 if wall > 0 else 0.0
+    compile_style(fg='light_cerulean', header=True).write(
+        f'PROFILE: {inside:.3f} s inside fun, of {wall:.3f} s wall time ({share:.1f}%)', out)
+    if len(rows) == 0:
+        compile_style(fg='warning').write('No spans recorded. Is profiling enabled?', out)
+        return
+
+    columns = ['name', 'calls', 'total_ms', 'self_ms', 'mean_ms', 'max_ms']
+    for r in rows:
+        for k in columns[2:]:
+            r[k] = f'{r[k]:.3f}'
+    Table(columns=columns, styles={'name': 'bold', 'total_ms': 'warning'}).print(rows, out)
+    return
+
+
+def _write_at_exit():
+    if _output is None:
+        return
+    try:
+        write(_output)
+    except OSError as e:
+        sys.stderr.write(f'fun.profiling: Could not write profile to {_output}: {e}\n')
+
+
+def _register_exit_hook():
+    global _exit_hook_registered
+    if not _exit_hook_registered:
+        atexit.register(_write_at_exit)
+        _exit_hook_registered = True
+    return
+
+
+if _enabled:
+    enable(f'fun-profile-{os.getpid()}' if _setting == '1' else _setting)
@@ -39,6 +39,14 @@ setuptools.setup(
 
     python_requires='>=3.7',
 
+    entry_points={
+        'console_scripts': [
+            'fun-et-daemon = fun.communications.daemon:main',
+            'fun-send = fun.communications.bulk:main',
+            'fun-highlight = fun.printing.highlight:main',
+        ],
+    },
+
     project_urls={
         'Source': 'https://github.com/supergus/fun',
     },